@@ -0,0 +1,99 @@
+"""
+解码基准：同一页面分别走 requests 的 Response.text（响应头未声明编码时整页探测字符集）、
+声明编码后的 Response.text、以及 Decoder 给出编码的 HtmlBytes 直接交给 lxml 三条路径，
+输出解码 + 解析的耗时，不需要网络
+
+    python -m benchmarks.bench_decode --pages book_hist_10000 --encoding gb18030 --repeat 5
+"""
+import argparse
+import re
+import statistics
+import time
+
+import requests
+
+import hw_libsys_api
+from benchmarks.pages import load
+
+# 样例页面 -> (解析方法, 额外参数)
+CASES = {
+    "book_hist_1000": ("parse_borrow_history", ()),
+    "book_hist_10000": ("parse_borrow_history", ()),
+    "top_lend": ("parse_recommendation_books", ()),
+    "openlink": ("parse_search_book", ("title", "Python", 1)),
+}
+
+
+def response(content, content_type=None):
+    resp = requests.Response()
+    resp._content = content
+    resp.status_code = 200
+    if content_type is not None:
+        resp.headers["Content-Type"] = content_type
+    resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+    return resp
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run_case(parser, name, encoding, repeat):
+    method, args = CASES[name]
+    parse = getattr(parser, method)
+    # 去掉 <meta> 声明，模拟汇文只在部分页面声明编码的情况
+    content = re.sub(r"<meta[^>]*>", "", load(name)).encode(encoding)
+    decoder = hw_libsys_api.Decoder()
+    url = "http://127.0.0.1/" + name
+    decoder.decode(url, {}, content)  # 先记住该路径的编码
+
+    def sniffed():
+        return parse(response(content).text, *args)
+
+    def declared():
+        return parse(response(content, f"text/html; charset={encoding}").text, *args)
+
+    def raw():
+        return parse(decoder.decode(url, {}, content), *args)
+
+    expected = declared()
+    assert raw() == expected
+    return {
+        "page": name,
+        "sniffed_ok": sniffed() == expected,
+        "kb": len(content) / 1024,
+        "sniffed_ms": timed(sniffed, repeat) * 1000,
+        "declared_ms": timed(declared, repeat) * 1000,
+        "bytes_ms": timed(raw, repeat) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", nargs="+", default=list(CASES), help="样例页面")
+    parser.add_argument("--encoding", default="utf-8", help="页面编码，如 utf-8、gb18030")
+    parser.add_argument("--parser", default="lxml", choices=hw_libsys_api.PARSERS)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = hw_libsys_api.PARSERS[args.parser]()
+    print(
+        f"{'page':<18}{'KB':>8}{'探测+解析 ms':>14}{'探测正确':>8}"
+        f"{'声明编码 ms':>13}{'HtmlBytes ms':>14}"
+    )
+    for name in args.pages:
+        r = run_case(engine, name, args.encoding, args.repeat)
+        print(
+            f"{r['page']:<18}{r['kb']:>8.0f}{r['sniffed_ms']:>14.1f}"
+            f"{'是' if r['sniffed_ok'] else '否':>8}"
+            f"{r['declared_ms']:>13.1f}{r['bytes_ms']:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
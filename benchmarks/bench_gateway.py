@@ -0,0 +1,74 @@
+"""
+网关合并请求基准：替身服务器模拟图书馆的响应延迟，大量并发请求同时访问网关的同一本书、热门借阅
+与同一用户的当前借阅，输出网关的吞吐、延迟与各接口的扇入比（请求数 / 上游请求数）
+
+    python -m benchmarks.bench_gateway --requests 500 --threads 100 --latency 0.2
+"""
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import hw_libsys_api
+from benchmarks.pages import load
+from benchmarks.standin import serve
+
+PATHS = ["/book/0000", "/book/0001", "/recommendation", "/me/borrow_list"]
+
+
+def fetch(session, url, token):
+    start = time.perf_counter()
+    resp = session.get(url, headers={"Authorization": "Bearer " + token})
+    assert resp.status_code == 200 and resp.json()["code"] == 1000, resp.text
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2, help="替身服务器每个响应的延迟（秒）")
+    args = parser.parse_args()
+
+    routes = {
+        "/opac/item.php": (load("item").encode(), {}),
+        "/top/top_lend.php": (load("top_lend").encode(), {}),
+        "/reader/book_lst.php": (load("book_lst").encode(), {}),
+    }
+    upstream, base_url = serve(routes, latency=args.latency)
+    gateway = hw_libsys_api.Gateway(
+        config=hw_libsys_api.Config(base_url, pool_size=args.threads)
+    )
+    server, gateway_url = gateway.serve()
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.threads))
+    token = session.put(
+        gateway_url + "/session", data=json.dumps({"cookies": {"PHPSESSID": "x"}})
+    ).json()["data"]["token"]
+    try:
+        urls = [gateway_url + PATHS[i % len(PATHS)] for i in range(args.requests)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            timings = sorted(pool.map(lambda url: fetch(session, url, token), urls))
+        elapsed = time.perf_counter() - start
+        stats = session.get(gateway_url + "/stats").json()
+    finally:
+        server.shutdown()
+        upstream.shutdown()
+
+    print(
+        f"{args.requests} 次请求  {elapsed:.3f} s  {args.requests / elapsed:.1f} req/s  "
+        f"p50 {statistics.median(timings) * 1000:.1f} ms  "
+        f"p99 {timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000:.1f} ms"
+    )
+    print(f"{'endpoint':<28}{'calls':>8}{'upstream':>10}{'fan-in':>8}")
+    for name, row in stats["endpoints"].items():
+        print(f"{name:<28}{row['calls']:>8}{row['upstream']:>10}{row['fan_in']:>8.1f}")
+    print(f"{'total':<28}{stats['calls']:>8}{stats['upstream']:>10}{stats['fan_in']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+冷启动耗时：在全新的解释器中测量导入模块、创建 Client 与完成第一个请求的时间
+
+    python -m benchmarks.bench_import --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.pages import load
+from benchmarks.standin import serve
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import hw_libsys_api
+imported = time.perf_counter()
+client = hw_libsys_api.Client(config=hw_libsys_api.Config(sys.argv[1]))
+created = time.perf_counter()
+assert client.get_book_detail("0000")["code"] == 1000
+done = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "client": created - imported,
+    "first_request": done - created,
+    "total": done - start,
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    server, base_url = serve({"/opac/item.php": (load("item").encode(), {})})
+    try:
+        samples = [
+            json.loads(
+                subprocess.run(
+                    [sys.executable, "-c", PROBE, base_url],
+                    cwd=ROOT,
+                    capture_output=True,
+                    check=True,
+                    text=True,
+                ).stdout
+            )
+            for _ in range(args.runs)
+        ]
+    finally:
+        server.shutdown()
+    for key in ("import", "client", "first_request", "total"):
+        values = [s[key] * 1000 for s in samples]
+        print(
+            f"{key:<15}median {statistics.median(values):8.2f} ms"
+            f"   min {min(values):8.2f} ms   max {max(values):8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+登录握手耗时：逐个请求（旧实现）与 sca/验证码并发请求的对比，以及密码编码的耗时
+
+    python -m benchmarks.bench_login --latency 0.03 --runs 20
+"""
+import argparse
+import random
+import statistics
+import time
+import timeit
+
+import hw_libsys_api
+from benchmarks.pages import SCA, load
+from benchmarks.standin import serve
+
+
+def legacy_encode_password(sca, password):
+    """优化前的 encode_password，仅用于对比"""
+    encode_password = ""
+    for i in range(len(password)):
+        try:
+            num0 = sca.index(password[i])
+        except ValueError:
+            num0 = -1
+        if num0 == -1:
+            code = hex(ord(password[i]))[2:]
+        else:
+            code = hex(ord(sca[(num0 + 3) % 62]))[2:]
+        num1 = int(random.random() * 62)
+        num2 = int(random.random() * 62)
+        encode_password += str(sca[num1]) + str(code) + str(sca[num2])
+    return encode_password
+
+
+def sequential_login(client):
+    """优化前的握手顺序：登录页、sca、验证码依次请求"""
+    client.parser.parse_csrf_token(client._get(client.login_url).text)
+    client.parser.parse_sca(client._get(client.ep_url).text)
+    client._get(client.captcha_url)
+
+
+def concurrent_login(client):
+    assert client.login("2019001001", "Passw0rd")["code"] == 1001
+
+
+def bench(name, func, config, runs):
+    timings = []
+    for _ in range(runs):
+        client = hw_libsys_api.Client(config=config)
+        start = time.perf_counter()
+        func(client)
+        timings.append((time.perf_counter() - start) * 1000)
+    print(
+        f"{name:<10}median {statistics.median(timings):8.2f} ms"
+        f"   p90 {sorted(timings)[int(len(timings) * 0.9) - 1]:8.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.03, help="替身服务器每个请求的延迟（秒）")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    cookie = {"Set-Cookie": "PHPSESSID=0123456789abcdef; path=/"}
+    server, base_url = serve(
+        {
+            "/reader/login.php": (load("login").encode(), cookie),
+            "/reader/ajax_ep.php": (load("ajax_ep").encode(), {}),
+            "/reader/captcha.php": (b"\x89PNG\r\n\x1a\n" + bytes(1024), {}),
+        },
+        latency=args.latency,
+    )
+    config = hw_libsys_api.Config(base_url)
+    try:
+        print(f"登录握手（每个请求延迟 {args.latency * 1000:.0f} ms）")
+        bench("逐个请求", sequential_login, config, args.runs)
+        bench("并发请求", concurrent_login, config, args.runs)
+    finally:
+        server.shutdown()
+
+    password = "Passw0rd!2022"
+    number = 20000
+    legacy = timeit.timeit(lambda: legacy_encode_password(SCA, password), number=number)
+    table = timeit.timeit(
+        lambda: hw_libsys_api.BaseClient.encode_password(SCA, password), number=number
+    )
+    print("密码编码")
+    print(f"{'逐字查找':<10}{legacy / number * 1e6:8.2f} µs/次")
+    print(f"{'对照表':<10}{table / number * 1e6:8.2f} µs/次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+解析卸载基准：模拟线程式 Web 服务，多个线程各自「等待网络 + 解析页面」，大页面（一千行借阅历史）
+与小页面（当前借阅）混合，对比在本线程解析与交给进程池解析时的总吞吐以及小页面的延迟，
+不需要网络；多核机器上差别才明显
+
+    python -m benchmarks.bench_offload --threads 16 --processes 4 --seconds 10
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+import hw_libsys_api
+from benchmarks.pages import load
+
+# (接口, 样例页面, 额外参数, 权重)
+MIX = [
+    ("get_borrow_history", "book_hist_1000", (), 1),
+    ("get_borrow_list", "book_lst", (), 4),
+    ("search_book", "openlink", ("title", "Python", 1), 2),
+]
+
+
+def worker(client, pages, io_seconds, deadline, latencies, counts, lock, n):
+    schedule = [item for item in MIX for _ in range(item[3])]
+    while time.perf_counter() < deadline:
+        endpoint, name, args, _ = schedule[n % len(schedule)]
+        n += 1
+        time.sleep(io_seconds)  # 模拟等待图书馆响应
+        start = time.perf_counter()
+        client.parse(endpoint, pages[name], *args)
+        seconds = time.perf_counter() - start
+        with lock:
+            counts[name] = counts.get(name, 0) + 1
+            latencies.setdefault(name, []).append(seconds)
+
+
+def run(parser, threads, seconds, io_seconds, executor):
+    pages = {name: load(name).encode() for _, name, _, _ in MIX}
+    client = hw_libsys_api.Client(parser=parser, executor=executor)
+    latencies, counts, lock = {}, {}, threading.Lock()
+    deadline = time.perf_counter() + seconds
+    pool = [
+        threading.Thread(
+            target=worker,
+            args=(client, pages, io_seconds, deadline, latencies, counts, lock, i),
+        )
+        for i in range(threads)
+    ]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    small = sorted(latencies.get("book_lst", [0.0]))
+    return {
+        "pages_per_sec": sum(counts.values()) / seconds,
+        "big_per_sec": counts.get("book_hist_1000", 0) / seconds,
+        "small_p50_ms": statistics.median(small) * 1000,
+        "small_p99_ms": small[min(len(small) - 1, int(len(small) * 0.99))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--parser", default="pyquery", choices=hw_libsys_api.PARSERS)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--io-ms", type=float, default=20.0, help="每次请求模拟的网络等待")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} 核，{args.threads} 线程，解析进程 {args.processes}")
+    print(f"{'mode':<10}{'pages/s':>10}{'大页面/s':>10}{'小页面 p50 ms':>15}{'p99 ms':>10}")
+    modes = [
+        ("inline", None),
+        ("offload", hw_libsys_api.parse_executor(args.processes, args.parser)),
+    ]
+    for mode, executor in modes:
+        if executor is not None:
+            # 子进程按需启动，先让每个子进程完成启动，不计入测量
+            warmup = [
+                executor.submit(time.sleep, 0.1) for _ in range(args.processes)
+            ]
+            for future in warmup:
+                future.result()
+        r = run(args.parser, args.threads, args.seconds, args.io_ms / 1000, executor)
+        print(
+            f"{mode:<10}{r['pages_per_sec']:>10.1f}{r['big_per_sec']:>10.1f}"
+            f"{r['small_p50_ms']:>15.2f}{r['small_p99_ms']:>10.2f}"
+        )
+        if executor is not None:
+            executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
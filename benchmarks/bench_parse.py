@@ -0,0 +1,85 @@
+"""
+离线解析基准：对 benchmarks/fixtures/ 下的页面逐个运行 Client 的解析路径，
+输出每页耗时、每秒行数与峰值内存，不需要网络
+
+    python -m benchmarks.bench_parse --parser pyquery lxml --repeat 20
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+
+import hw_libsys_api
+from benchmarks.pages import load
+
+# 样例页面 -> (解析方法, 额外参数, 从结果中取出行列表)
+CASES = {
+    "login": ("parse_csrf_token", (), None),
+    "ajax_ep": ("parse_sca", (), None),
+    "redr_info": ("parse_info", (load("redr_info_rule"),), None),
+    "book_lst": ("parse_borrow_list", (), lambda r: r["data"]["books"]),
+    "book_hist_10": ("parse_borrow_history", (), lambda r: r["data"]),
+    "book_hist_1000": ("parse_borrow_history", (), lambda r: r["data"]),
+    "book_hist_10000": ("parse_borrow_history", (), lambda r: r["data"]),
+    "account": ("parse_pay_list", (), lambda r: r["data"]["items"]),
+    "fine_pec": ("parse_pay_detail", (), lambda r: r["data"]),
+    "top_lend": ("parse_recommendation_books", (), lambda r: r["data"]["books"]),
+    "openlink": ("parse_search_book", ("title", "Python", 1), lambda r: r["data"]["books"]),
+    "item": ("parse_book_detail", (), lambda r: r["data"]["books"]),
+}
+
+
+def run_case(parser, name, repeat):
+    method, args, rows_of = CASES[name]
+    text = load(name)
+    parse = getattr(parser, method)
+    result = parse(text, *args)
+    rows = len(rows_of(result)) if rows_of else 1
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(text, *args)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse(text, *args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latency = statistics.median(timings)
+    return {
+        "page": name,
+        "rows": rows,
+        "latency_ms": latency * 1000,
+        "rows_per_sec": rows / latency,
+        "peak_kb": peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--parser", nargs="+", default=list(hw_libsys_api.PARSERS), help="解析引擎"
+    )
+    parser.add_argument("--pages", nargs="+", default=list(CASES), help="样例页面")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(
+        f"{'parser':<10}{'page':<18}{'rows':>7}{'ms/page':>11}{'rows/s':>12}{'peak KB':>11}"
+    )
+    for engine in args.parser:
+        instance = hw_libsys_api.PARSERS[engine]()
+        for name in args.pages:
+            # 万行页面单次解析已足够稳定，避免基准耗时过长
+            repeat = 1 if name.endswith("10000") else args.repeat
+            r = run_case(instance, name, repeat)
+            print(
+                f"{engine:<10}{r['page']:<18}{r['rows']:>7}{r['latency_ms']:>11.2f}"
+                f"{r['rows_per_sec']:>12.0f}{r['peak_kb']:>11.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
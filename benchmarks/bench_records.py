@@ -0,0 +1,90 @@
+"""
+行对象基准：同一批解析结果分别以字典与 Record 保存时的内存占用，以及序列化为 JSON 的耗时，
+不需要网络
+
+    python -m benchmarks.bench_records --pages book_hist_10000 fine_pec --repeat 20
+"""
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+
+import hw_libsys_api
+from benchmarks.pages import load
+
+# 样例页面 -> (解析方法, 额外参数, 从结果中取出行列表)
+CASES = {
+    "book_lst": ("parse_borrow_list", (), lambda r: r["data"]["books"]),
+    "book_hist_10000": ("parse_borrow_history", (), lambda r: r["data"]),
+    "fine_pec": ("parse_pay_detail", (), lambda r: r["data"]),
+    "openlink": ("parse_search_book", ("title", "Python", 1), lambda r: r["data"]["books"]),
+    "item": ("parse_book_detail", (), lambda r: r["data"]["books"]),
+}
+
+
+def traced(build):
+    """build() 新分配的内存（字节），字符串在两种表示之间共享，只统计容器本身"""
+    tracemalloc.start()
+    value = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, size
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run_case(name, copies, repeat):
+    method, args, rows_of = CASES[name]
+    rows = rows_of(getattr(hw_libsys_api.LxmlParser(), method)(load(name), *args)) * copies
+    record = hw_libsys_api.RecordParser.records[method][1]
+
+    dicts, dict_bytes = traced(lambda: [dict(row) for row in rows])
+    records, record_bytes = traced(lambda: [record.from_dict(row) for row in rows])
+    assert [r.to_dict() for r in records] == dicts
+
+    return {
+        "page": name,
+        "rows": len(rows),
+        "dict_kb": dict_bytes / 1024,
+        "record_kb": record_bytes / 1024,
+        "json_ms": timed(lambda: json.dumps(dicts, ensure_ascii=False).encode(), repeat) * 1000,
+        "dumps_ms": timed(lambda: hw_libsys_api.dumps(records), repeat) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", nargs="+", default=list(CASES), help="样例页面")
+    parser.add_argument("--copies", type=int, default=1, help="把每页的行重复多少份")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    try:
+        import orjson  # noqa: F401
+
+        serializer = "orjson"
+    except ImportError:
+        serializer = "json"
+    print(f"dumps 使用 {serializer}")
+    print(
+        f"{'page':<18}{'rows':>8}{'dict KB':>10}{'record KB':>11}"
+        f"{'json.dumps ms':>15}{'dumps ms':>10}"
+    )
+    for name in args.pages:
+        r = run_case(name, args.copies, args.repeat)
+        print(
+            f"{r['page']:<18}{r['rows']:>8}{r['dict_kb']:>10.0f}{r['record_kb']:>11.0f}"
+            f"{r['json_ms']:>15.2f}{r['dumps_ms']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
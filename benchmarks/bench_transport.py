@@ -0,0 +1,71 @@
+"""
+共享连接池与「每个 Client 一个 Session」的吞吐对比
+
+    python -m benchmarks.bench_transport --users 200 --requests 5 --threads 16
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import hw_libsys_api
+from benchmarks.standin import serve
+
+DETAIL_PAGE = (
+    "<html><body><div id='item_detail'><dl><dt>题名/责任者:</dt>"
+    "<dd><a href='#'>Python</a>/张三</dd></dl></div>"
+    "<table id='item'><tr><td>索书号</td></tr></table></body></html>"
+).encode()
+
+
+def run_user(make_client, requests_per_user):
+    client = make_client()
+    for _ in range(requests_per_user):
+        assert client.get_book_detail("0000")["code"] == 1000
+
+
+def bench(name, make_client, users, requests_per_user, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(
+            pool.map(
+                lambda _: run_user(make_client, requests_per_user), range(users)
+            )
+        )
+    elapsed = time.perf_counter() - start
+    total = users * requests_per_user
+    print(f"{name:<24}{total:>8} 次请求  {elapsed:8.3f} s  {total / elapsed:10.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5, help="每个用户的请求数")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--pool-size", type=int, default=16)
+    args = parser.parse_args()
+
+    server, base_url = serve({"/opac/item.php": (DETAIL_PAGE, {})})
+    config = hw_libsys_api.Config(base_url, pool_size=args.pool_size)
+    transport = hw_libsys_api.Transport(pool_size=config.pool_size)
+    try:
+        bench(
+            "每个 Client 独立 Session",
+            lambda: hw_libsys_api.Client(config=config),
+            args.users,
+            args.requests,
+            args.threads,
+        )
+        bench(
+            "共享 Transport",
+            lambda: hw_libsys_api.Client(transport=transport, config=config),
+            args.users,
+            args.requests,
+            args.threads,
+        )
+    finally:
+        transport.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
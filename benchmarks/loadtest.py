@@ -0,0 +1,170 @@
+"""
+压测：多个模拟读者同时登录并按比例调用各接口，输出每个接口的吞吐、p50/p99 延迟与状态码分布
+默认启动本地的完整汇文替身（benchmarks/standin.py），也可用 --base-url 指向已启动的替身；
+用于在不访问真实图书馆的情况下调整连接池大小、并发上限与超时
+
+    python -m benchmarks.loadtest --users 50 --seconds 20 --latency 0.05 --jitter 0.03 --error-rate 0.01
+    python -m benchmarks.loadtest --users 50 --rate 100 --scheduler-rate 80 --breaker
+"""
+import argparse
+import collections
+import random
+import statistics
+import threading
+import time
+
+import hw_libsys_api
+from benchmarks.standin import serve_libsys
+
+# 接口 -> (参数, 权重)
+MIX = {
+    "get_info": ((), 2),
+    "get_borrow_list": ((), 4),
+    "get_borrow_history": ((), 1),
+    "get_pay_list": ((), 1),
+    "get_pay_detail": ((), 1),
+    "get_recommendation_books": ((), 2),
+    "search_book": (("title", "Python", 1), 3),
+    "get_book_detail": (("4b6a45352b52432f4b577a66676838626476376f38770001",), 3),
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.codes = collections.defaultdict(collections.Counter)
+        self._lock = threading.Lock()
+
+    def call(self, endpoint, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.codes[endpoint][result["code"]] += 1
+        return result
+
+
+def reader(make_client, number, deadline, recorder, seed):
+    rng = random.Random(seed)
+    endpoints = list(MIX)
+    weights = [MIX[name][1] for name in endpoints]
+    client = make_client()
+    while time.perf_counter() < deadline:
+        result = recorder.call("login", client.login, number, "Passw0rd")
+        if result["code"] != 1001:
+            continue
+        data = dict(result["data"], captcha="1234")
+        if recorder.call("login_with_captcha", client.login_with_captcha, **data)["code"] == 1000:
+            break
+    while time.perf_counter() < deadline:
+        endpoint = rng.choices(endpoints, weights)[0]
+        recorder.call(endpoint, getattr(client, endpoint), *MIX[endpoint][0])
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def report(recorder, seconds):
+    print(
+        f"{'endpoint':<26}{'calls':>8}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}  codes"
+    )
+    total = 0
+    for endpoint, values in sorted(recorder.latencies.items()):
+        values.sort()
+        total += len(values)
+        codes = ", ".join(f"{c}×{n}" for c, n in sorted(recorder.codes[endpoint].items()))
+        print(
+            f"{endpoint:<26}{len(values):>8}{len(values) / seconds:>9.1f}"
+            f"{statistics.median(values) * 1000:>9.1f}{percentile(values, 0.99) * 1000:>9.1f}  {codes}"
+        )
+    print(f"{'total':<26}{total:>8}{total / seconds:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", help="已启动的替身服务器地址，不传时在本进程启动")
+    parser.add_argument("--users", type=int, default=20, help="并发的模拟读者数（每人一个线程）")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--pool-size", type=int, default=10, help="共享连接池的大小")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--parser", default="lxml", choices=hw_libsys_api.PARSERS)
+    parser.add_argument("--scheduler-rate", type=float, default=0.0, help="客户端限速，0 为不限")
+    parser.add_argument("--breaker", action="store_true", help="启用熔断与自适应超时")
+    group = parser.add_argument_group("替身服务器（未传 --base-url 时）")
+    group.add_argument("--latency", type=float, default=0.05)
+    group.add_argument("--jitter", type=float, default=0.02)
+    group.add_argument("--slow-rate", type=float, default=0.0)
+    group.add_argument("--error-rate", type=float, default=0.0)
+    group.add_argument("--reset-rate", type=float, default=0.0)
+    group.add_argument("--rate", type=float, default=0.0, help="服务器端每 IP 限速，0 为不限")
+    group.add_argument("--burst", type=int, default=20)
+    group.add_argument("--ban-seconds", type=float, default=0.0)
+    group.add_argument("--history-rows", type=int, default=100)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server, base_url = serve_libsys(
+            latency=args.latency,
+            jitter=args.jitter,
+            slow_rate=args.slow_rate,
+            slow_latency=args.timeout * 2,
+            error_rate=args.error_rate,
+            reset_rate=args.reset_rate,
+            rate=args.rate,
+            burst=args.burst,
+            ban_seconds=args.ban_seconds,
+            history_rows=args.history_rows,
+            seed=0,
+        )
+    config = hw_libsys_api.Config(base_url, timeout=args.timeout, pool_size=args.pool_size)
+    transport = hw_libsys_api.Transport(pool_size=args.pool_size)
+    scheduler = (
+        hw_libsys_api.Scheduler(rate=args.scheduler_rate, burst=args.users)
+        if args.scheduler_rate
+        else None
+    )
+    breaker = hw_libsys_api.CircuitBreaker() if args.breaker else None
+
+    def make_client():
+        return hw_libsys_api.Client(
+            transport=transport,
+            parser=args.parser,
+            config=config,
+            scheduler=scheduler,
+            breaker=breaker,
+        )
+
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(
+            target=reader,
+            args=(make_client, "2019%06d" % i, deadline, recorder, i),
+        )
+        for i in range(args.users)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    transport.close()
+
+    print(f"{args.users} 个读者，{elapsed:.1f} s，连接池 {args.pool_size}，超时 {args.timeout} s")
+    report(recorder, elapsed)
+    if server is not None:
+        summary = server.libsys.summary()
+        server.shutdown()
+        injected = {
+            kind: sum(paths.values()) for kind, paths in summary.items() if kind != "requests"
+        }
+        print(f"替身服务器：{sum(summary['requests'].values())} 个请求，注入 {injected or '无'}")
+
+
+if __name__ == "__main__":
+    main()
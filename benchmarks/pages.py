@@ -0,0 +1,272 @@
+"""
+汇文 Libsys 页面样例，结构与真实页面一致，供离线解析基准与替身服务器使用
+
+    python -m benchmarks.pages  # 重新生成 benchmarks/fixtures/ 下的页面
+"""
+import os
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+SCA = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+MARC = "4b6a45352b52432f4b577a66676838626476376f38773d3d"
+
+
+def marc_no(i):
+    return "%s%04x" % (MARC[:-4], i % 65536)
+
+
+def page(body, title="我的图书馆"):
+    return (
+        "<!DOCTYPE html>\r\n<html>\r\n<head>\r\n"
+        '<meta http-equiv="Content-Type" content="text/html; charset=utf-8" />\r\n'
+        f"<title>{title}</title>\r\n</head>\r\n<body>\r\n{body}\r\n"
+        '<div id="footer">&nbsp;江苏汇文软件有限公司&nbsp;&copy;&nbsp;版权所有</div>\r\n'
+        "</body>\r\n</html>\r\n"
+    )
+
+
+def expired():
+    return page(
+        '<div class="box"><h5 class="box_bgcolor">登录我的图书馆</h5>'
+        '<form method="post" action="redr_verify.php">'
+        '<input type="hidden" name="csrf_token" value="5f2a9c0e1b" /></form></div>'
+    )
+
+
+def login():
+    return page(
+        '<div class="box"><h5 class="box_bgcolor">登录我的图书馆</h5>\r\n'
+        '<form method="post" action="redr_verify.php" name="frm_login">\r\n'
+        '<input type="hidden" name="csrf_token" value="5f2a9c0e1b" />\r\n'
+        '<input type="hidden" id="sca" name="sca" value="" />\r\n'
+        '<input type="text" name="number" /><input type="password" name="passwd" />\r\n'
+        '<img id="regimg" src="captcha.php" /><input type="text" name="captcha" />\r\n'
+        "</form></div>"
+    )
+
+
+def ep():
+    return f'document.getElementById("sca").setAttribute("value","{SCA}");'
+
+
+def info_index():
+    return page(
+        '<div id="mylib_content">\r\n'
+        '<div class="infobox"><span class="infobox-data-number">0</span> 超期图书</div>\r\n'
+        '<div class="infobox"><span class="infobox-data-number">2</span> 委托到书</div>\r\n'
+        '<span class="bigger-170"> 20 </span><span class="bigger-170"> 5 </span>'
+        '<span class="bigger-170"> 5 </span>\r\n'
+        '<p>您的借阅量超过了 <span class="Num">68.5%</span> 的读者</p>\r\n</div>'
+    )
+
+
+INFO_ROWS = [
+    [("姓名", "张三"), ("证件号", "2019001001"), ("条码号", "2019001001")],
+    [("失效日期", "2023-07-01"), ("办证日期", "2019-09-01"), ("生效日期", "2019-09-01")],
+    [("最大可借图书", "20"), ("最大可预约图书", "5"), ("最大可委托图书", "5")],
+    [("读者类型", "本科生"), ("借阅等级", "一级"), ("累计借书", "128册次")],
+    [("违章次数", "1"), ("欠款金额", "0.00"), ("系别", "计算机学院")],
+    [("工作单位", ""), ("职业/职称", "学生"), ("职位", "")],
+    [("身份证号", ""), ("籍贯", ""), ("性别", "男")],
+    [("邮箱", ""), ("电话", ""), ("手机", "")],
+    [("地址", ""), ("邮编", ""), ("备注", ""), ("押金", "100.00"), ("手续费", "0.00")],
+]
+
+
+def info():
+    rows = "".join(
+        "<tr>"
+        + "".join(f'<td><span class="bluetext">{k}：</span>{v}</td>' for k, v in row)
+        + "</tr>\r\n"
+        for row in INFO_ROWS
+    )
+    return page(f'<div id="mylib_info"><table>\r\n{rows}</table></div>')
+
+
+def borrow_list(n=10):
+    rows = "".join(
+        f"<tr>\r\n<td>A{1000000 + i}</td>\r\n"
+        f'<td><a class="blue" href="../opac/item.php?marc_no={marc_no(i)}">Python 编程 第{i}卷</a> / 张三 著</td>\r\n'
+        f"<td>2022-03-{1 + i % 28:02d}</td>\r\n"
+        f'<td><font color="">2022-05-{1 + i % 28:02d} </font></td>\r\n'
+        f"<td>{i % 3}</td>\r\n<td>自然科学书库</td>\r\n"
+        '<td><input type="button" value="续借" /></td>\r\n</tr>\r\n'
+        for i in range(n)
+    )
+    return page(
+        '<div id="mylib_content">\r\n'
+        f'<p style="margin:10px auto;">当前借阅( <b class="blue">{n}</b> ) / 最大借阅( <b class="blue">20</b> )</p>\r\n'
+        '<table width="100%" class="table_line">\r\n'
+        "<tr><td>条码号</td><td>题名/责任者</td><td>借阅日期</td><td>应还日期</td>"
+        "<td>续借量</td><td>馆藏地</td><td>附件</td></tr>\r\n"
+        f"{rows}</table>\r\n</div>"
+    )
+
+
+def borrow_history(n=10):
+    rows = "".join(
+        f'<tr>\r\n<td bgcolor="#FFFFFF">{i + 1}</td>\r\n'
+        f'<td bgcolor="#FFFFFF">A{1000000 + i}</td>\r\n'
+        f'<td bgcolor="#FFFFFF"><a href="../opac/item.php?marc_no={marc_no(i)}" class="blue">数据结构与算法分析 {i}</a></td>\r\n'
+        f'<td bgcolor="#FFFFFF">李四</td>\r\n'
+        f'<td bgcolor="#FFFFFF">20{10 + i % 12}-0{1 + i % 9}-1{i % 10}</td>\r\n'
+        f'<td bgcolor="#FFFFFF">20{10 + i % 12}-0{1 + i % 9}-2{i % 10}</td>\r\n'
+        '<td bgcolor="#FFFFFF">社会科学书库</td>\r\n</tr>\r\n'
+        for i in range(n)
+    )
+    return page(
+        '<div id="mylib_content">\r\n<table width="100%" class="table_line">\r\n'
+        "<tr><td>序号</td><td>条码号</td><td>题名</td><td>责任者</td>"
+        "<td>借阅日期</td><td>归还日期</td><td>馆藏地</td></tr>\r\n"
+        f"{rows}</table>\r\n</div>"
+    )
+
+
+def pay_list(n=10):
+    rows = "".join(
+        f"<tr><td> 2022-0{1 + i % 9}-1{i % 10} </td><td> 超期罚款 </td>"
+        f"<td> 0.00 </td><td> {i % 5}.{i % 10}0 </td><td> 现金 </td>"
+        f"<td> P{200000 + i} </td></tr>\r\n"
+        for i in range(n)
+    )
+    return page(
+        '<div id="mylib_content">\r\n<table width="100%" class="table_line">\r\n'
+        "<tr><td>结算日期</td><td>结算项目</td><td>退款</td><td>缴款</td>"
+        "<td>结算方式</td><td>票据号</td></tr>\r\n"
+        f"{rows}"
+        '<tr><td colspan="6">合计: 退款 0.00 元, 缴款 12.30 元 (数据截至 2022-06-01)</td></tr>\r\n'
+        "</table>\r\n</div>"
+    )
+
+
+def pay_detail(n=10):
+    rows = "".join(
+        f"<tr><td> A{1000000 + i} </td><td> TP311.56/{i} </td>"
+        f'<td><a href="../opac/item.php?marc_no={marc_no(i)}" class="blue"> 计算机网络 {i} </a></td>'
+        "<td> 谢希仁 </td><td> 2022-01-05 </td><td> 2022-03-05 </td>"
+        f"<td> 自然科学书库 </td><td> {i % 5}.00 </td><td> 0.00 </td><td> 未交 </td></tr>\r\n"
+        for i in range(n)
+    )
+    return page(
+        '<div id="mylib_content">\r\n<h2>欠款信息</h2>\r\n'
+        '<table width="100%" class="table_line">\r\n'
+        "<tr><td>条码号</td><td>索书号</td><td>题名</td><td>责任者</td><td>借阅日期</td>"
+        "<td>应还日期</td><td>馆藏地</td><td>应缴</td><td>实缴</td><td>状态</td></tr>\r\n"
+        f"{rows}</table>\r\n</div>"
+    )
+
+
+def top_lend(n=100):
+    rows = "".join(
+        f'<tr>\r\n<td class="whitetext">{i + 1}</td>\r\n'
+        f'<td class="whitetext"><a href="../opac/item.php?marc_no={marc_no(i)}" class="blue">三体 {i}</a></td>\r\n'
+        '<td class="whitetext">刘慈欣著</td>\r\n<td class="whitetext">重庆出版社</td>\r\n'
+        f'<td class="whitetext">I247.55/{i}</td>\r\n<td class="whitetext">{5 + i % 7}</td>\r\n'
+        f'<td class="whitetext">{300 - i}</td>\r\n<td class="whitetext">{(300 - i) / (5 + i % 7):.2f}</td>\r\n</tr>\r\n'
+        for i in range(n)
+    )
+    return page(
+        '<table width="100%" class="table_line">\r\n'
+        "<tr><td>排名</td><td>题名</td><td>责任者</td><td>出版信息</td><td>索书号</td>"
+        "<td>馆藏</td><td>借阅次数</td><td>借阅比</td></tr>\r\n"
+        f"{rows}</table>",
+        "热门借阅",
+    )
+
+
+def search(n=20, page_no=1, pages=5, count=None):
+    items = "".join(
+        '<li class="book_list_info">\r\n'
+        f'<h3><span>中文图书</span><a href="item.php?marc_no={marc_no(page_no * n + i)}">{i + 1}.Python 编程从入门到实践 {page_no}-{i}</a>        TP311.561/{i}       </h3>\r\n'
+        f"<p><span>馆藏复本：{3 + i % 4} <br />&#13;\n"
+        f"可借复本：{i % 3} </span>埃里克·马瑟斯著 <br />&#13;\n"
+        f"人民邮电出版社  2016 <br />&#13;\n"
+        f'<a href="item.php?marc_no={marc_no(page_no * n + i)}">详细信息</a>\r\n</p>\r\n</li>\r\n'
+        for i in range(n)
+    )
+    count = n * pages if count is None else count
+    return page(
+        '<div id="container">\r\n'
+        f'<p>检索到 <strong class="red">{count}</strong> 条结果</p>\r\n'
+        f'<ol id="search_book_list">\r\n{items}</ol>\r\n'
+        f'<span class="num_prev">第 <b><font color="red">{page_no}</font>/<font color="black">{pages}</font></b> 页</span>\r\n'
+        "</div>",
+        "书目检索",
+    )
+
+
+def detail(n=6):
+    dls = [
+        ("题名/责任者", '<a href="openlink.php?title=Python">Python 编程从入门到实践</a>/(美) 埃里克·马瑟斯著'),
+        ("出版发行项", "北京:人民邮电出版社,2016"),
+        ("ISBN及定价", "978-7-115-42802-8/CNY89.00"),
+        ("载体形态项", "459页:图;26cm"),
+        ("其它题名", "Python crash course"),
+        ("个人责任者", '<a href="openlink.php?author=Matthes">马瑟斯</a> (Matthes, Eric) 著'),
+        ("个人次要责任者", "袁国忠 译"),
+        ("学科主题", "软件工具-程序设计"),
+        ("中图法分类号", "TP311.561"),
+        ("一般附注", "Python 3"),
+        ("责任者附注", "埃里克·马瑟斯，高中科学和数学老师"),
+        ("提要文摘附注", "本书是一本针对所有层次的Python读者而作的Python入门书。"),
+    ]
+    dl = "".join(f"<dl><dt>{k}:</dt><dd>{v}</dd></dl>\r\n" for k, v in dls)
+    rows = "".join(
+        f'<tr align="left" class="whitetext">\r\n<td width="10%">TP311.561/{i}</td>\r\n'
+        f'<td width="15%">A{2000000 + i}</td>\r\n<td width="25%">  -  </td>\r\n'
+        f'<td width="20%" title="还书位置：图书馆一楼">自然科学书库  </td>\r\n'
+        f'<td width="30%">{"可借" if i % 2 else "借出-应还日期：2022-06-01"}</td>\r\n</tr>\r\n'
+        for i in range(n)
+    )
+    return page(
+        f'<div id="item_detail">\r\n{dl}</div>\r\n'
+        '<table width="100%" id="item">\r\n'
+        "<tr><td>索书号</td><td>条码号</td><td>年卷期</td><td>馆藏地</td><td>书刊状态</td></tr>\r\n"
+        f"{rows}</table>",
+        "书目详细信息",
+    )
+
+
+def empty(msg="您的该项记录为空！"):
+    return page(
+        f'<div id="mylib_content">\r\n<div class="iconerr">{msg}</div>\r\n</div>'
+    )
+
+
+# 文件名（不含 .html）与生成函数；book_hist_10000 体积较大，不随仓库提交，首次使用时生成
+FIXTURES = {
+    "login": login,
+    "ajax_ep": ep,
+    "expired": expired,
+    "redr_info": info_index,
+    "redr_info_rule": info,
+    "book_lst": borrow_list,
+    "book_lst_empty": lambda: empty("您的该项记录为空！"),
+    "book_hist_10": lambda: borrow_history(10),
+    "book_hist_1000": lambda: borrow_history(1000),
+    "book_hist_10000": lambda: borrow_history(10000),
+    "account": pay_list,
+    "fine_pec": pay_detail,
+    "fine_pec_empty": lambda: empty("您的欠款记录为空！"),
+    "top_lend": top_lend,
+    "openlink": search,
+    "item": detail,
+}
+
+
+def load(name):
+    """读取样例页面，文件不存在时生成并保存"""
+    filename = os.path.join(FIXTURE_DIR, name + ".html")
+    if not os.path.exists(filename):
+        with open(filename, "w", encoding="UTF-8", newline="") as f:
+            f.write(FIXTURES[name]())
+    with open(filename, "r", encoding="UTF-8", newline="") as f:
+        return f.read()
+
+
+if __name__ == "__main__":
+    for name, render in FIXTURES.items():
+        with open(
+            os.path.join(FIXTURE_DIR, name + ".html"), "w", encoding="UTF-8", newline=""
+        ) as f:
+            f.write(render())
@@ -0,0 +1,345 @@
+"""
+本地替身服务器，供基准测试与压测使用，不访问真实图书馆
+serve 按路径返回固定页面；serve_libsys 是完整的汇文替身（会话、延迟抖动、错误注入与限流）
+
+    python -m benchmarks.standin --port 8765 --latency 0.05 --jitter 0.02 --rate 50
+"""
+import argparse
+import collections
+import itertools
+import random
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks import pages
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    routes = {}
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_any(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if self.latency:
+            time.sleep(self.latency)
+        route = self.routes.get(urlsplit(self.path).path)
+        if route is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body, headers = route
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = handle_any
+    do_POST = handle_any
+
+
+def serve(routes, latency=0.0, host="127.0.0.1", port=0):
+    """
+    在后台线程启动替身服务器，返回 (server, base_url)
+    routes: {路径: (响应体 bytes, 额外响应头 dict)}
+    """
+    handler = type(
+        "Handler", (StandinHandler,), {"routes": routes, "latency": latency}
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://%s:%d" % server.server_address
+
+
+class LibsysHandler(StandinHandler):
+    """
+    完整的汇文替身：实现 Client 用到的全部路径，维护登录会话，并可注入延迟抖动、错误与限流
+    页面由 benchmarks/pages.py 生成，每种页面只渲染一次
+    """
+
+    libsys = None
+
+    def handle_any(self):
+        libsys = self.libsys
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+        path = urlsplit(self.path).path
+        libsys.count("requests", path)
+        if not libsys.admit(self.client_address[0]):
+            libsys.count("throttled", path)
+            if libsys.ban_mode == "reset":
+                self.close_connection = True
+                self.connection.close()
+                return
+            return self.reply(503, "访问过于频繁，请稍后再试".encode())
+        libsys.sleep()
+        fault = libsys.fault()
+        if fault == "reset":
+            libsys.count("reset", path)
+            self.close_connection = True
+            self.connection.close()
+            return
+        if fault == "error":
+            libsys.count("error", path)
+            return self.reply(500, b"<html><body>Internal Server Error</body></html>")
+        handler = libsys.routes.get(path)
+        if handler is None:
+            return self.reply(404, b"")
+        handler(self, parse_qs(urlsplit(self.path).query), parse_qs(body))
+
+    def reply(self, status, body, headers=None, content_type="text/html; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已超时断开
+            self.close_connection = True
+
+    def session(self):
+        cookie = SimpleCookie(self.headers.get("Cookie") or "")
+        return cookie["PHPSESSID"].value if "PHPSESSID" in cookie else None
+
+    do_GET = handle_any
+    do_POST = handle_any
+
+
+class Libsys:
+    """
+    替身图书馆的页面、会话与故障注入
+    latency / jitter: 每个响应的基础延迟与均匀抖动（秒）
+    slow_rate / slow_latency: 按概率出现的慢响应，用于触发客户端超时
+    error_rate: 返回 HTTP 500 的概率；reset_rate: 直接断开连接的概率
+    rate / burst: 每个客户端 IP 的令牌桶，超出后按 ban_mode 返回 503 或断开连接，
+    并在 ban_seconds 内持续拒绝（模拟被封禁）；rate 为 0 时不限流
+    reject: 登录时视为密码错误的证件号；验证码为 "0000" 时视为验证码错误
+    history_rows / search_pages: 借阅历史行数与搜索结果总页数
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        jitter=0.0,
+        slow_rate=0.0,
+        slow_latency=10.0,
+        error_rate=0.0,
+        reset_rate=0.0,
+        rate=0.0,
+        burst=20,
+        ban_mode="status",
+        ban_seconds=0.0,
+        reject=(),
+        history_rows=100,
+        search_pages=5,
+        seed=None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.reset_rate = reset_rate
+        self.rate = rate
+        self.burst = burst
+        self.ban_mode = ban_mode
+        self.ban_seconds = ban_seconds
+        self.reject = set(reject)
+        self.search_pages = search_pages
+        self.random = random.Random(seed)
+        self.stats = collections.defaultdict(collections.Counter)
+        self.sessions = {}
+        self._buckets = {}
+        self._banned = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.bodies = {
+            "login": pages.login().encode(),
+            "login_error": pages.login().replace(
+                "</form>",
+                '<font id="fontMsg" color="red">对不起，用户名或密码错误，请查实！</font></form>',
+            ).encode(),
+            "captcha_error": pages.login().replace(
+                "</form>", '<font id="fontMsg" color="red">对不起，验证码错误！</font></form>'
+            ).encode(),
+            "ep": pages.ep().encode(),
+            "captcha": b"\x89PNG\r\n\x1a\n" + bytes(1024),
+            "expired": pages.expired().encode(),
+            "info_index": pages.info_index().encode(),
+            "info": pages.info().encode(),
+            "borrow_list": pages.borrow_list().encode(),
+            "borrow_history": pages.borrow_history(history_rows).encode(),
+            "pay_list": pages.pay_list().encode(),
+            "pay_detail": pages.pay_detail().encode(),
+            "top_lend": pages.top_lend().encode(),
+            "detail": pages.detail().encode(),
+        }
+        self._search = {}
+        private = {
+            "/reader/redr_info.php": "info_index",
+            "/reader/redr_info_rule.php": "info",
+            "/reader/book_lst.php": "borrow_list",
+            "/reader/book_hist.php": "borrow_history",
+            "/reader/account.php": "pay_list",
+            "/reader/fine_pec.php": "pay_detail",
+        }
+        self.routes = {
+            "/reader/login.php": self.login,
+            "/reader/ajax_ep.php": self.static("ep", "text/javascript; charset=utf-8"),
+            "/reader/captcha.php": self.static("captcha", "image/png"),
+            "/reader/redr_verify.php": self.verify,
+            "/top/top_lend.php": self.static("top_lend"),
+            "/opac/openlink.php": self.search,
+            "/opac/item.php": self.static("detail"),
+        }
+        for path, name in private.items():
+            self.routes[path] = self.private(name)
+
+    def count(self, kind, path):
+        with self._lock:
+            self.stats[kind][path] += 1
+
+    def admit(self, ip):
+        """令牌桶限流，超出后在 ban_seconds 内拒绝该 IP 的全部请求"""
+        if not self.rate:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            if self._banned.get(ip, 0.0) > now:
+                return False
+            tokens, last = self._buckets.get(ip, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[ip] = (tokens, now)
+                if self.ban_seconds:
+                    self._banned[ip] = now + self.ban_seconds
+                return False
+            self._buckets[ip] = (tokens - 1, now)
+            return True
+
+    def sleep(self):
+        with self._lock:
+            slow = self.random.random() < self.slow_rate
+            delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        time.sleep(self.slow_latency if slow else max(delay, 0.0))
+
+    def fault(self):
+        with self._lock:
+            roll = self.random.random()
+        if roll < self.reset_rate:
+            return "reset"
+        if roll < self.reset_rate + self.error_rate:
+            return "error"
+        return None
+
+    def static(self, name, content_type="text/html; charset=utf-8"):
+        def handle(request, query, form):
+            request.reply(200, self.bodies[name], content_type=content_type)
+
+        return handle
+
+    def private(self, name):
+        def handle(request, query, form):
+            logged_in = self.sessions.get(request.session(), False)
+            request.reply(200, self.bodies[name if logged_in else "expired"])
+
+        return handle
+
+    def login(self, request, query, form):
+        headers = {}
+        if request.session() is None:
+            sid = "%016x" % next(self._ids)
+            with self._lock:
+                self.sessions[sid] = False
+            headers["Set-Cookie"] = f"PHPSESSID={sid}; path=/"
+        request.reply(200, self.bodies["login"], headers)
+
+    def verify(self, request, query, form):
+        sid = request.session()
+        number = form.get("number", [""])[0]
+        if form.get("captcha", [""])[0] == "0000":
+            return request.reply(200, self.bodies["captcha_error"])
+        if sid not in self.sessions or number in self.reject:
+            return request.reply(200, self.bodies["login_error"])
+        with self._lock:
+            self.sessions[sid] = True
+        request.reply(302, b"<html><body></body></html>", {"Location": "redr_info.php"})
+
+    def search(self, request, query, form):
+        page_no = int(query.get("page", ["1"])[0])
+        body = self._search.get(page_no)
+        if body is None:
+            # 超出总页数时汇文仍显示页码信息，由客户端判断越界
+            body = pages.search(page_no=page_no, pages=self.search_pages).encode()
+            self._search[page_no] = body
+        request.reply(200, body)
+
+    def summary(self):
+        with self._lock:
+            return {kind: dict(paths) for kind, paths in self.stats.items()}
+
+
+def serve_libsys(host="127.0.0.1", port=0, **options):
+    """
+    在后台线程启动完整的汇文替身，返回 (server, base_url)；server.libsys 为 Libsys 实例，
+    其 summary() 给出各路径的请求数与注入的故障数，options 见 Libsys
+    """
+    libsys = Libsys(**options)
+    handler = type("Handler", (LibsysHandler,), {"libsys": libsys})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.libsys = libsys
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://%s:%d" % server.server_address
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动完整的汇文替身服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--reset-rate", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=0.0, help="每个 IP 每秒请求数，0 为不限")
+    parser.add_argument("--burst", type=int, default=20)
+    parser.add_argument("--ban-seconds", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, base_url = serve_libsys(
+        args.host,
+        args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        reset_rate=args.reset_rate,
+        rate=args.rate,
+        burst=args.burst,
+        ban_seconds=args.ban_seconds,
+    )
+    print(f"汇文替身服务器：{base_url}（Ctrl-C 停止）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,649 +1,4209 @@
 import base64
+import bisect
+import collections
+import contextlib
+import copy
+import functools
+import hashlib
+import heapq
+import http.cookiejar
+import inspect
+import itertools
+import threading
 import time
 import json
+import operator
 import os
 import re
 import traceback
-from urllib.parse import urljoin
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from urllib.parse import parse_qsl, urljoin, urlsplit
 
 import requests
-from pyquery import PyQuery as pq
+import urllib3
 from requests import exceptions
 import random
 
+# pyquery、lxml、aiohttp、asyncio 与 sqlite3 导入较慢，首次使用时才在函数内导入，
+# 见 pq / extract_text / import_aiohttp / _XPath；urllib3 已由 requests 导入，不增加耗时
+aiohttp = None
+asyncio = None  # AsyncClient 的方法使用，由 import_aiohttp 一并导入
 
-def get_config(section: str, field: str):
-    filename = os.path.join(os.path.dirname(__file__), "config.json")
+CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config.json")
+
+
+def pq(*args, **kwargs):
+    global pq
+    from pyquery import PyQuery as pq
+
+    return pq(*args, **kwargs)
+
+
+def extract_text(dom, **kwargs):
+    global extract_text
+    from pyquery.text import extract_text
+
+    return extract_text(dom, **kwargs)
+
+
+def import_aiohttp():
+    global aiohttp, asyncio, TIMEOUT_ERRORS
+    if aiohttp is None:
+        try:
+            import aiohttp as module
+        except ImportError:
+            raise ImportError("AsyncClient 需要安装 aiohttp")
+        import asyncio as asyncio_module
+
+        aiohttp, asyncio = module, asyncio_module
+        # Python 3.11 之前 asyncio.TimeoutError 与内置的 TimeoutError 不是同一个类
+        TIMEOUT_ERRORS = (exceptions.Timeout, TimeoutError, asyncio.TimeoutError)
+    return aiohttp
+
+
+@functools.lru_cache(maxsize=None)
+def load_config_file(filename: str = CONFIG_FILE):
+    """读取并缓存配置文件，同一文件只解析一次"""
     if not os.path.exists(filename):
         raise Exception("配置文件不存在")
     with open(filename, "r", encoding="UTF-8") as f:
-        config = json.loads(f.read())
-    return config.get(section, {}).get(field)
+        return json.loads(f.read())
+
+
+def get_config(section: str, field: str):
+    return load_config_file().get(section, {}).get(field)
+
+
+class Config:
+    """
+    客户端配置，可直接传给 Client / AsyncClient；不传时从 config.json 读取
+    timeout: 读取超时（秒）；connect_timeout: 连接超时，为空时与 timeout 共用一个总超时
+    pool_size: 单个主机保留的最大连接数
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 5,
+        connect_timeout: float = None,
+        pool_size: int = 10,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+
+    @classmethod
+    def from_file(cls, filename: str = CONFIG_FILE):
+        config = load_config_file(filename)
+        request = config.get("request", {})
+        return cls(
+            base_url=config.get("library", {}).get("base_url"),
+            timeout=request.get("timeout", 5),
+            connect_timeout=request.get("connect_timeout"),
+            pool_size=request.get("pool_size", 10),
+        )
+
+    @property
+    def requests_timeout(self):
+        """requests 的 timeout 参数"""
+        if self.connect_timeout is None:
+            return self.timeout
+        return (self.connect_timeout, self.timeout)
+
+
+@functools.lru_cache(maxsize=None)
+def default_config():
+    """未传入 config 的客户端共用的配置，首次创建客户端时才读取 config.json"""
+    return Config.from_file()
+
+
+def __getattr__(name):
+    # 兼容以前的模块级常量，访问时才读取配置文件
+    if name == "BASE_URL":
+        return default_config().base_url
+    if name == "TIMEOUT":
+        return default_config().timeout
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/56.0.2924.87 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+TIMEOUT_ERRORS = (exceptions.Timeout, TimeoutError)
+CONNECTION_ERRORS = (
+    exceptions.RequestException,
+    json.decoder.JSONDecodeError,
+    AttributeError,
+)
+
+
+def charset_of(headers):
+    """从响应头的 Content-Type 中取出声明的编码，未声明时返回 None"""
+    charset = re.search(r"charset=([\w-]+)", headers.get("Content-Type") or "", re.I)
+    return charset.group(1) if charset else None
+
+
+class HtmlBytes(bytes):
+    """响应正文的原始字节及其编码，解析器直接按该编码交给 lxml，不再先解码为 str"""
+
+    def __new__(cls, content, encoding):
+        obj = super().__new__(cls, content)
+        obj.encoding = encoding
+        return obj
+
+    def __reduce__(self):
+        return (type(self), (bytes(self), self.encoding))
+
+    @property
+    def text(self):
+        return self.decode(self.encoding, errors="replace")
+
+
+class Decoder:
+    """
+    响应正文的编码识别：依次使用响应头声明的编码、页面前 2KB 中 <meta> 声明的 charset；
+    都没有时按 主机+路径 记住第一次识别的结果（能按 UTF-8 解码即为 UTF-8，否则为 GB18030），
+    之后同一路径的页面不再做任何探测。空页面与纯 ASCII 页面按哪种编码解码都一样，也无从判断，
+    按 UTF-8 解码但不记住，等到第一个含非 ASCII 字节的页面再识别。GB2312/GBK 统一按其超集 GB18030 解码
+    """
+
+    aliases = {"gb2312": "gb18030", "gbk": "gb18030", "utf8": "utf-8"}
+    _meta = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.I)
+
+    def __init__(self):
+        self._learned = {}
+
+    def encoding(self, url, headers, content: bytes = None):
+        """content 为空时（流式读取）只看响应头与已记住的编码，仍未知时返回 None"""
+        declared = charset_of(headers)
+        if declared is None and content is not None:
+            meta = self._meta.search(content, 0, 2048)
+            declared = meta.group(1).decode("ascii") if meta else None
+        if declared is not None:
+            declared = declared.lower()
+            return self.aliases.get(declared, declared)
+        parts = urlsplit(url)
+        key = parts.netloc + parts.path
+        encoding = self._learned.get(key)
+        if encoding is None and content is not None:
+            if content.isascii():
+                return "utf-8"
+            try:
+                content.decode("utf-8")
+                encoding = "utf-8"
+            except UnicodeDecodeError:
+                encoding = "gb18030"
+            self._learned[key] = encoding
+        return encoding
+
+    def decode(self, url, headers, content: bytes):
+        return HtmlBytes(content, self.encoding(url, headers, content) or "utf-8")
+
+    def stats(self):
+        return dict(self._learned)
+
+
+_html_parsers = threading.local()
+
+
+def html_document(text):
+    """str 或 HtmlBytes 解析为 lxml 文档；lxml 的解析器不能跨线程共用，按线程缓存"""
+    from lxml import html as lxml_html
+
+    if not isinstance(text, HtmlBytes):
+        return lxml_html.fromstring(text)
+    parsers = _html_parsers.__dict__
+    parser = parsers.get(text.encoding)
+    if parser is None:
+        parser = parsers[text.encoding] = lxml_html.HTMLParser(encoding=text.encoding)
+    return lxml_html.document_fromstring(text, parser=parser)
+
+
+class LibsysError(Exception):
+    """生成器类接口无法通过返回值给出状态码，失败时抛出此异常，result 为原始结果"""
+
+    def __init__(self, result):
+        super().__init__(f"{result['code']}：{result['msg']}")
+        self.result = result
+        self.code = result["code"]
+
+
+class CircuitOpenError(Exception):
+    """熔断期间直接拒绝请求，code 为触发熔断的错误对应的状态码（1003 或 2333）"""
+
+    def __init__(self, host, code, retry_after):
+        super().__init__(f"{host} 已熔断，{retry_after:.1f} 秒后重试")
+        self.host = host
+        self.code = code
+        self.retry_after = retry_after
+
+
+def error_result(action: str, e: Exception):
+    """将请求/解析时的异常转换为状态码，需在 except 块内调用"""
+    if isinstance(e, TIMEOUT_ERRORS) or (isinstance(e, CircuitOpenError) and e.code == 1003):
+        return {"code": 1003, "msg": f"{action}超时"}
+    if not isinstance(e, CircuitOpenError):
+        traceback.print_exc()
+    if isinstance(e, (CONNECTION_ERRORS, CircuitOpenError)) or (
+        aiohttp is not None and isinstance(e, aiohttp.ClientError)
+    ):
+        return {"code": 2333, "msg": "连接错误：图书馆系统可能无法正常访问"}
+    return {"code": 999, "msg": f"{action}时未记录的错误：{str(e)}"}
+
+
+def catch_errors(action: str):
+    """接口异常处理装饰器，同时支持同步与异步方法；客户端设置了 metrics 时记录耗时与状态码"""
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = await func(self, *args, **kwargs)
+                except Exception as e:
+                    result = error_result(action, e)
+                if self.metrics is not None:
+                    self.metrics.observe_call(
+                        func.__name__, result, time.perf_counter() - start
+                    )
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(self, *args, **kwargs)
+            except Exception as e:
+                result = error_result(action, e)
+            if self.metrics is not None:
+                self.metrics.observe_call(func.__name__, result, time.perf_counter() - start)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def cached(endpoint: str):
+    """公共接口结果缓存装饰器，实例未设置 cache 时直接请求"""
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def key_args(self, args, kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            return tuple(bound.arguments.values())[1:]
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                if self.cache is None:
+                    return await func(self, *args, **kwargs)
+                return await self.cache.afetch(
+                    endpoint,
+                    key_args(self, args, kwargs),
+                    lambda: func(self, *args, **kwargs),
+                )
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if self.cache is None:
+                return func(self, *args, **kwargs)
+            return self.cache.fetch(
+                endpoint,
+                key_args(self, args, kwargs),
+                lambda: func(self, *args, **kwargs),
+            )
+
+        return wrapper
+
+    return decorator
+
+
+class PyQueryParser:
+    """页面解析（PyQuery），只处理 HTML 文本，不发起请求"""
+
+    # 读者信息页的标签与字段名的对应关系
+    info_labels = {
+        "姓名": "name",
+        "失效日期": "cert_end",
+        "办证日期": "cert_start",
+        "生效日期": "cert_work",
+        "读者类型": "type",
+        "借阅等级": "level",
+        "累计借书": "cumulative_borrow",
+        "违章次数": "violation_num",
+        "欠款金额": "violation_money",
+        "性别": "sex",
+        "押金": "deposit",
+        "手续费": "charge",
+    }
+    info_label_re = re.compile(r"\s*([^：]+?)\s*：(.*)", re.S)
+
+    # 图书详情页 dt 标签与字段名的对应关系
+    detail_fields = {
+        "其它题名": "oth_title",
+        "个人责任者": "author",
+        "个人次要责任者": "oth_author",
+        "学科主题": "category",
+        "出版发行项": "publisher",
+        "ISBN及定价": "isbn",
+        "载体形态项": "physical",
+        "一般附注": "notes",
+        "责任者附注": "author_notes",
+        "提要文摘附注": "abstract",
+        "中图法分类号": "call_no",
+    }
+
+    @staticmethod
+    def _pq(text):
+        """HtmlBytes 按其编码直接解析为 lxml 文档再交给 PyQuery"""
+        if isinstance(text, HtmlBytes):
+            return pq(html_document(text))
+        return pq(text)
+
+    def is_expired(self, doc):
+        return doc("h5.box_bgcolor").text() == "登录我的图书馆"
+
+    def parse_session_valid(self, text):
+        """页面不是登录页即说明 cookies 仍然有效"""
+        return not self.is_expired(self._pq(text))
+
+    def parse_csrf_token(self, text):
+        return self._pq(text)("input[name='csrf_token']").attr("value")
+
+    def parse_sca(self, text):
+        if isinstance(text, HtmlBytes):
+            text = text.text
+        return re.findall(r"setAttribute\(\"value\"\,\"(.*)\"\);", text)[0]
+
+    def parse_login_error(self, text):
+        """解析登录失败信息，登录成功时返回 None"""
+        error = self._pq(text)("font#fontMsg[color='red']")
+        if error.text() != "":
+            error_msg = error.text()
+            if "用户名或密码错误" in error_msg:
+                return {"code": 1002, "msg": "用户名或密码不正确"}
+            if "验证码" in error_msg:
+                return {"code": 1004, "msg": "验证码输入错误"}
+            return {"code": 999, "msg": "错误：" + error_msg}
+        return None
+
+    def parse_verify_csrf_token(self, text):
+        return self._pq(text)("input#csrf_token").attr("value")
+
+    def parse_verify_result(self, text):
+        doc = self._pq(text)
+        tips = doc(".iconerr")
+        if str(tips) != "" and "密码修改成功" in tips.text():
+            return {"code": 1000, "msg": "密码修改成功，请重新登录"}
+        error = doc("font[color='red']")
+        if error.text() != "":
+            error_msg = error.text()
+            if "身份验证失败" in error_msg:
+                return {"code": 999, "msg": "姓名不匹配，身份验证失败"}
+            return {"code": 998, "msg": "错误：" + error_msg}
+        return {"code": 999, "msg": "身份认证时未记录的错误"}
+
+    def parse_info(self, index_text, info_text):
+        doc_index = self._pq(index_text)
+        if self.is_expired(doc_index):
+            return {"code": 1006, "msg": "登录过期，请重新登录"}
+        access_list = [
+            n.text().replace(" ", "") for n in doc_index(".bigger-170").items()
+        ]
+        max_borrow = access_list[0]
+        max_order = access_list[1]
+        max_entrust = access_list[2]
+        overdue = doc_index("span.infobox-data-number:first").text()
+        percent = doc_index(".Num").text()
+        fields = self.parse_info_fields(info_text)
+        if not fields:
+            return {"code": 999, "msg": "获取个人信息时未记录的错误：读者信息无法解析"}
+        result = {
+            "name": fields.get("name"),
+            "cert_start": fields.get("cert_start"),
+            "cert_work": fields.get("cert_work"),
+            "cert_end": fields.get("cert_end"),
+            "max_borrow": max_borrow,
+            "max_order": max_order,
+            "max_entrust": max_entrust,
+            "overdue": overdue,
+            "type": fields.get("type"),
+            "level": fields.get("level"),
+            "cumulative_borrow": fields.get("cumulative_borrow"),
+            "violation_num": fields.get("violation_num"),
+            "violation_money": fields.get("violation_money"),
+            "sex": fields.get("sex"),
+            "deposit": fields.get("deposit"),
+            "charge": fields.get("charge"),
+            "percent": percent,
+        }
+        return {"code": 1000, "msg": "获取个人信息成功", "data": result}
+
+    def parse_info_fields(self, text):
+        """按「标签：值」解析读者信息表的每个单元格，返回字段名到值的映射，缺失的标签不出现在结果中"""
+        fields = {}
+        for td in self._pq(text)("div#mylib_info td").items():
+            match = self.info_label_re.match(td.text())
+            if match and match.group(1) in self.info_labels:
+                fields[self.info_labels[match.group(1)]] = match.group(2).strip()
+        return fields
+
+    def parse_borrow_list(self, text):
+        doc = self._pq(text)
+        if self.is_expired(doc):
+            return {"code": 1006, "msg": "登录过期，请重新登录"}
+        if str(doc(".iconerr")) != "":
+            return {"code": 1005, "msg": "当前无借阅"}
+
+        trs = list(doc("table:eq(0) tr").items())
+        result = {
+            "now": doc("div#mylib_content p[style='margin:10px auto;'] b:first")
+            .text()
+            .strip(),
+            "max": doc("div#mylib_content p[style='margin:10px auto;'] b:eq(1)")
+            .text()
+            .strip(),
+            "books": [
+                {
+                    "title": trs[i]("td:eq(1) a.blue").text(),
+                    "author": trs[i]("td:eq(1)").text().split("/")[1].strip(),
+                    "location": trs[i]("td:eq(5)").text(),
+                    "borrow_date": trs[i]("td:eq(2)").text(),
+                    "due_date": trs[i]("td:eq(3)").text().strip(),
+                    "cnum": trs[i]("td:eq(4)").text(),
+                    "bar_code": trs[i]("td:eq(0)").text(),
+                    "marc_no": self.get_marc_no(
+                        trs[i]("td:eq(1) a.blue").attr("href")
+                    ),
+                }
+                for i in range(1, len(trs))
+            ],
+        }
+        return {"code": 1000, "msg": "获取借阅列表成功", "data": result}
+
+    def parse_borrow_history(self, text):
+        doc = self._pq(text)
+        if self.is_expired(doc):
+            return {"code": 1006, "msg": "登录过期，请重新登录"}
+        if str(doc(".iconerr")) != "":
+            return {"code": 1005, "msg": "无历史借阅"}
+
+        trs = list(doc("table tr").items())
+        result = [
+            {
+                "index": trs[i]("td:eq(0)").text(),
+                "title": trs[i]("td:eq(2) a.blue").text(),
+                "author": trs[i]("td:eq(3)").text(),
+                "location": trs[i]("td:eq(6)").text(),
+                "borrow_date": trs[i]("td:eq(4)").text(),
+                "return_date": trs[i]("td:eq(5)").text(),
+                "bar_code": trs[i]("td:eq(1)").text(),
+                "marc_no": self.get_marc_no(trs[i]("td:eq(2) a.blue").attr("href")),
+            }
+            for i in range(1, len(trs))
+        ]
+        return {"code": 1000, "msg": "获取历史借阅成功", "data": result}
+
+    def parse_pay_list(self, text):
+        doc = self._pq(text)
+        if self.is_expired(doc):
+            return {"code": 1006, "msg": "登录过期，请重新登录"}
+        if str(doc(".iconerr")) != "":
+            return {"code": 1005, "msg": "无账目清单"}
+
+        trs = list(doc("table tr").items())
+        total = "".join(trs[len(trs) - 1]("td:eq(0)").text().strip().split())
+        result = {
+            "description": total[total.find(":") + 1 :][
+                : total[total.find(":") + 1 :].find("(")
+            ],
+            "items": [
+                {
+                    "date": trs[i]("td:eq(0)").text().strip(),
+                    "type": trs[i]("td:eq(1)").text().strip(),
+                    "refund": trs[i]("td:eq(2)").text().strip(),
+                    "contribution": trs[i]("td:eq(3)").text().strip(),
+                    "pay_method": trs[i]("td:eq(4)").text().strip(),
+                    "bill_no": trs[i]("td:eq(5)").text().strip(),
+                }
+                for i in range(1, len(trs) - 1)
+            ],
+        }
+        return {"code": 1000, "msg": "获取账目清单成功", "data": result}
+
+    def parse_pay_detail(self, text):
+        doc = self._pq(text)
+        if self.is_expired(doc):
+            return {"code": 1006, "msg": "登录过期，请重新登录"}
+        if str(doc(".iconerr")) != "" and "欠款记录为空" in str(doc(".iconerr")):
+            return {"code": 1005, "msg": "无欠款记录"}
+        table = doc("h2").text("欠款信息").next()
+        trs = list(table("tr").items())
+        result = [
+            {
+                "title": trs[i]("td:eq(2)").text().strip(),
+                "author": trs[i]("td:eq(3)").text().strip(),
+                "location": trs[i]("td:eq(6)").text().strip(),
+                "borrow_date": trs[i]("td:eq(4)").text().strip(),
+                "due_date": trs[i]("td:eq(5)").text().strip(),
+                "marc_no": self.get_marc_no(trs[i]("td:eq(2) a").attr("href")),
+                "bar_code": trs[i]("td:eq(0)").text().strip(),
+                "call_no": trs[i]("td:eq(1)").text().strip(),
+                "payable": trs[i]("td:eq(7)").text().strip(),
+                "payin": trs[i]("td:eq(8)").text().strip(),
+                "state": trs[i]("td:eq(9)").text().strip(),
+            }
+            for i in range(1, len(trs))
+        ]
+        return {"code": 1000, "msg": "获取欠款信息成功", "data": result}
+
+    def parse_recommendation_books(self, text):
+        doc = self._pq(text)
+        trs = list(doc("table.table_line tr").items())
+        return {
+            "code": 1000,
+            "msg": "获取热门借阅成功",
+            "data": {
+                "updated": int(time.time()),
+                "books": [
+                    {
+                        "index": trs[i]("td:eq(0)").text(),
+                        "title": trs[i]("td:eq(1) a").text(),
+                        "author": trs[i]("td:eq(2)").text(),
+                        "publisher": trs[i]("td:eq(3)").text(),
+                        "total_num": trs[i]("td:eq(5)").text(),
+                        "borrowed_times": trs[i]("td:eq(6)").text(),
+                        "borrowed_ratio": trs[i]("td:eq(7)").text(),
+                        "marc_no": self.get_marc_no(trs[i]("td:eq(1) a").attr("href")),
+                        "call_no": trs[i]("td:eq(4)").text(),
+                    }
+                    for i in range(1, len(trs))
+                ],
+            },
+        }
+
+    def parse_search_book(self, text, type, content: str, page: int):
+        doc = self._pq(text)
+        container = doc("div#container")
+        count = container("strong.red").text()
+        search_list = container("ol#search_book_list").items("li")
+        total_page = container("span.num_prev b font[color='black']").text()
+        pages = int(total_page) if total_page != "" else 1
+        if page > pages:
+            return {"code": 999, "msg": "已超过最多页数"}
+
+        result = {
+            "type": type,
+            "content": content,
+            "count": count,
+            "page": page,
+            "pages": pages,
+            "books": [
+                {
+                    "type": i("h3 span").text(),
+                    "title": i("h3 a").text()[i("h3 a").text().find(".") + 1 :],
+                    "author": re.findall(r"span>(.*)<", str(i("p")))[1].strip(),
+                    "publisher": "".join(
+                        re.findall(r"(.*) <br/>&#13", str(i("p")))[2].strip().split()
+                    ),
+                    "total_num": re.findall(r"馆藏复本：(\d+)", str(i("p")))[0],
+                    "loanable_num": re.findall(r"可借复本：(\d+)", str(i("p")))[0],
+                    "marc_no": self.get_marc_no(i("p a").attr("href")),
+                    "call_no": re.findall(r"</a>(.*)</h3>", str(i("h3")))[0].strip(),
+                }
+                for i in search_list
+            ],
+        }
+        return {"code": 1000, "msg": "搜索图书成功", "data": result}
+
+    def parse_book_detail(self, text):
+        doc = self._pq(text)
+        details = doc("#item_detail dl").items()
+        trs = list(doc("table#item tr").items())
+        result = {}
+        for i in details:
+            if "题名/责任者" in i("dt").text():
+                result["title"] = i("dd a").text()
+                result["full_title"] = i("dd").text()
+            for key in self.detail_fields.keys():
+                if key in i("dt").text():
+                    result[self.detail_fields[key]] = i("dd").text()
+        result["books"] = [
+            {
+                "annual_roll": "".join(trs[n]("td:eq(2)").text().split()),
+                "location": trs[n]("td:eq(3)").text().strip(),
+                "return_location": trs[n]("td:eq(3)").attr("title"),
+                "status": trs[n]("td:eq(4)").text(),
+                "bar_code": trs[n]("td:eq(1)").text(),
+                "call_no": trs[n]("td:eq(0)").text(),
+            }
+            for n in range(1, len(trs))
+        ]
+        return {"code": 1000, "msg": "获取图书详情成功", "data": result}
+
+    @classmethod
+    def get_marc_no(cls, content):
+        marc_no = re.findall(r"marc_no=(.*)", content)
+        if not marc_no:
+            return None
+        return marc_no[0]
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class _XPath:
+    """类属性上的预编译 XPath，第一次使用时才导入 lxml 并编译，之后替换为编译结果"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner):
+        from lxml import etree
+
+        compiled = etree.XPath(self.path)
+        setattr(owner, self.name, compiled)
+        return compiled
+
+
+class LxmlParser(PyQueryParser):
+    """
+    页面解析（lxml + 预编译 XPath），输出与 PyQueryParser 完全一致
+    表格逐行遍历一次，每行只取一次单元格列表，不再为每个单元格构造 PyQuery 选择器；
+    单元格文本沿用 pyquery 的 extract_text，保证空白处理相同
+    """
+
+    _expired = _XPath(f"//h5[{_has_class('box_bgcolor')}]")
+    _iconerr = _XPath(f"//*[{_has_class('iconerr')}]")
+    _first_table_trs = _XPath("(//table)[1]//tr")
+    _table_trs = _XPath("//table//tr")
+    _table_line_trs = _XPath(f"//table[{_has_class('table_line')}]//tr")
+    _item_trs = _XPath("//table[@id='item']//tr")
+    _borrow_nums = _XPath(
+        "//div[@id='mylib_content']//p[@style='margin:10px auto;']//b"
+    )
+    _detail_dls = _XPath("//*[@id='item_detail']//dl")
+    _blue_links = _XPath(f".//a[{_has_class('blue')}]")
+    _trs = _XPath(".//tr")
+
+    @classmethod
+    def _doc(cls, text):
+        return html_document(text)
+
+    @classmethod
+    def _text(cls, elements):
+        return " ".join(extract_text(e) for e in elements)
+
+    @classmethod
+    def _cells(cls, tr):
+        return list(tr.iter("td"))
+
+    @classmethod
+    def _cell(cls, tds, n):
+        return extract_text(tds[n]) if n < len(tds) else ""
+
+    @classmethod
+    def _links(cls, tds, n, xpath=None):
+        if n >= len(tds):
+            return []
+        return xpath(tds[n]) if xpath is not None else list(tds[n].iter("a"))
+
+    @classmethod
+    def _href(cls, links):
+        return links[0].get("href") if links else None
+
+    def is_expired(self, doc):
+        from lxml import etree
+
+        if not isinstance(doc, etree._Element):
+            return super().is_expired(doc)
+        return self._text(self._expired(doc)) == "登录我的图书馆"
+
+    def parse_borrow_list(self, text):
+        doc = self._doc(text)
+        if self.is_expired(doc):
+            return {"code": 1006, "msg": "登录过期，请重新登录"}
+        if self._iconerr(doc):
+            return {"code": 1005, "msg": "当前无借阅"}
+
+        nums = self._borrow_nums(doc)
+        books = []
+        for tr in self._first_table_trs(doc)[1:]:
+            tds = self._cells(tr)
+            links = self._links(tds, 1, self._blue_links)
+            books.append(
+                {
+                    "title": self._text(links),
+                    "author": self._cell(tds, 1).split("/")[1].strip(),
+                    "location": self._cell(tds, 5),
+                    "borrow_date": self._cell(tds, 2),
+                    "due_date": self._cell(tds, 3).strip(),
+                    "cnum": self._cell(tds, 4),
+                    "bar_code": self._cell(tds, 0),
+                    "marc_no": self.get_marc_no(self._href(links)),
+                }
+            )
+        result = {
+            "now": self._text(nums[:1]).strip(),
+            "max": self._text(nums[1:2]).strip(),
+            "books": books,
+        }
+        return {"code": 1000, "msg": "获取借阅列表成功", "data": result}
+
+    def parse_borrow_history(self, text):
+        doc = self._doc(text)
+        if self.is_expired(doc):
+            return {"code": 1006, "msg": "登录过期，请重新登录"}
+        if self._iconerr(doc):
+            return {"code": 1005, "msg": "无历史借阅"}
+
+        result = [self.history_row(tr) for tr in self._table_trs(doc)[1:]]
+        return {"code": 1000, "msg": "获取历史借阅成功", "data": result}
+
+    @classmethod
+    def history_row(cls, tr):
+        tds = cls._cells(tr)
+        links = cls._links(tds, 2, cls._blue_links)
+        return {
+            "index": cls._cell(tds, 0),
+            "title": cls._text(links),
+            "author": cls._cell(tds, 3),
+            "location": cls._cell(tds, 6),
+            "borrow_date": cls._cell(tds, 4),
+            "return_date": cls._cell(tds, 5),
+            "bar_code": cls._cell(tds, 1),
+            "marc_no": cls.get_marc_no(cls._href(links)),
+        }
+
+    def parse_pay_list(self, text):
+        doc = self._doc(text)
+        if self.is_expired(doc):
+            return {"code": 1006, "msg": "登录过期，请重新登录"}
+        if self._iconerr(doc):
+            return {"code": 1005, "msg": "无账目清单"}
+
+        trs = self._table_trs(doc)
+        total = "".join(self._cell(self._cells(trs[-1]), 0).strip().split())
+        items = []
+        for tr in trs[1:-1]:
+            tds = self._cells(tr)
+            items.append(
+                {
+                    "date": self._cell(tds, 0).strip(),
+                    "type": self._cell(tds, 1).strip(),
+                    "refund": self._cell(tds, 2).strip(),
+                    "contribution": self._cell(tds, 3).strip(),
+                    "pay_method": self._cell(tds, 4).strip(),
+                    "bill_no": self._cell(tds, 5).strip(),
+                }
+            )
+        result = {
+            "description": total[total.find(":") + 1 :][
+                : total[total.find(":") + 1 :].find("(")
+            ],
+            "items": items,
+        }
+        return {"code": 1000, "msg": "获取账目清单成功", "data": result}
+
+    def parse_pay_detail(self, text):
+        doc = self._doc(text)
+        if self.is_expired(doc):
+            return {"code": 1006, "msg": "登录过期，请重新登录"}
+        from lxml import etree
+
+        iconerr = "".join(etree.tostring(e, encoding=str) for e in self._iconerr(doc))
+        if iconerr != "" and "欠款记录为空" in iconerr:
+            return {"code": 1005, "msg": "无欠款记录"}
+        trs, seen = [], set()
+        for h2 in doc.iter("h2"):
+            table = h2.getnext()
+            for tr in self._trs(table) if table is not None else []:
+                if tr not in seen:
+                    seen.add(tr)
+                    trs.append(tr)
+        result = []
+        for tr in trs[1:]:
+            tds = self._cells(tr)
+            result.append(
+                {
+                    "title": self._cell(tds, 2).strip(),
+                    "author": self._cell(tds, 3).strip(),
+                    "location": self._cell(tds, 6).strip(),
+                    "borrow_date": self._cell(tds, 4).strip(),
+                    "due_date": self._cell(tds, 5).strip(),
+                    "marc_no": self.get_marc_no(self._href(self._links(tds, 2))),
+                    "bar_code": self._cell(tds, 0).strip(),
+                    "call_no": self._cell(tds, 1).strip(),
+                    "payable": self._cell(tds, 7).strip(),
+                    "payin": self._cell(tds, 8).strip(),
+                    "state": self._cell(tds, 9).strip(),
+                }
+            )
+        return {"code": 1000, "msg": "获取欠款信息成功", "data": result}
+
+    def parse_recommendation_books(self, text):
+        doc = self._doc(text)
+        books = []
+        for tr in self._table_line_trs(doc)[1:]:
+            tds = self._cells(tr)
+            links = self._links(tds, 1)
+            books.append(
+                {
+                    "index": self._cell(tds, 0),
+                    "title": self._text(links),
+                    "author": self._cell(tds, 2),
+                    "publisher": self._cell(tds, 3),
+                    "total_num": self._cell(tds, 5),
+                    "borrowed_times": self._cell(tds, 6),
+                    "borrowed_ratio": self._cell(tds, 7),
+                    "marc_no": self.get_marc_no(self._href(links)),
+                    "call_no": self._cell(tds, 4),
+                }
+            )
+        return {
+            "code": 1000,
+            "msg": "获取热门借阅成功",
+            "data": {"updated": int(time.time()), "books": books},
+        }
+
+    def parse_book_detail(self, text):
+        doc = self._doc(text)
+        result = {}
+        for dl in self._detail_dls(doc):
+            dt = self._text(dl.iter("dt"))
+            dds = list(dl.iter("dd"))
+            if "题名/责任者" in dt:
+                result["title"] = self._text(a for dd in dds for a in dd.iter("a"))
+                result["full_title"] = self._text(dds)
+            for key in self.detail_fields.keys():
+                if key in dt:
+                    result[self.detail_fields[key]] = self._text(dds)
+        books = []
+        for tr in self._item_trs(doc)[1:]:
+            tds = self._cells(tr)
+            books.append(
+                {
+                    "annual_roll": "".join(self._cell(tds, 2).split()),
+                    "location": self._cell(tds, 3).strip(),
+                    "return_location": tds[3].get("title") if len(tds) > 3 else None,
+                    "status": self._cell(tds, 4),
+                    "bar_code": self._cell(tds, 1),
+                    "call_no": self._cell(tds, 0),
+                }
+            )
+        result["books"] = books
+        return {"code": 1000, "msg": "获取图书详情成功", "data": result}
+
+
+class HistorySync:
+    """
+    历史借阅增量解析：边下载边解析，解析到检查点所在行即停止
+    汇文的借阅历史按时间倒序排列（序号 1 为最近一次借阅），检查点之前的行即为新增记录；
+    检查点为 {"index", "bar_code", "borrow_date"}，按条码号与借阅日期匹配
+    PyQuery 无法流式解析，这里直接使用 lxml 的 HTMLPullParser
+    """
+
+    def __init__(self, checkpoint: dict = None, encoding: str = None):
+        self.checkpoint = checkpoint
+        self.books = []
+        self.done = False
+        self.status = None
+        from lxml import etree
+
+        self._parser = etree.HTMLPullParser(events=("end",), encoding=encoding)
+        self._header = True
+
+    @classmethod
+    def make_checkpoint(cls, book):
+        return {
+            "index": book["index"],
+            "bar_code": book["bar_code"],
+            "borrow_date": book["borrow_date"],
+        }
+
+    def _reached(self, book):
+        return (
+            self.checkpoint is not None
+            and book["bar_code"] == self.checkpoint.get("bar_code")
+            and book["borrow_date"] == self.checkpoint.get("borrow_date")
+        )
+
+    def feed(self, chunk):
+        """送入一段响应内容，返回是否已可停止下载"""
+        if not self.done:
+            self._parser.feed(chunk)
+            self._read_events()
+        return self.done
+
+    def close(self):
+        if not self.done:
+            self._parser.close()
+            self._read_events()
+            self.done = True
+
+    def _read_events(self):
+        for _, el in self._parser.read_events():
+            classes = (el.get("class") or "").split()
+            if el.tag == "tr":
+                if self._header:
+                    self._header = False
+                    continue
+                book = LxmlParser.history_row(el)
+                if self._reached(book):
+                    self.done = True
+                    return
+                self.books.append(book)
+                el.clear()
+            elif "box_bgcolor" in classes and extract_text(el) == "登录我的图书馆":
+                self.status = {"code": 1006, "msg": "登录过期，请重新登录"}
+                self.done = True
+                return
+            elif "iconerr" in classes:
+                self.status = {"code": 1005, "msg": "无历史借阅"}
+                self.done = True
+                return
+
+    def result(self):
+        if self.status is not None:
+            return self.status
+        checkpoint = (
+            self.make_checkpoint(self.books[0]) if self.books else self.checkpoint
+        )
+        return {
+            "code": 1000,
+            "msg": "同步历史借阅成功",
+            "data": {"books": self.books, "checkpoint": checkpoint},
+        }
+
+
+PARSERS = {"pyquery": PyQueryParser, "lxml": LxmlParser}
+
+
+class Record:
+    """
+    解析结果中一行数据的紧凑表示（__slots__），字段及顺序与原来的字典一致
+    支持 record["title"] / record.get / dict(record) 读取，to_dict 无损转换回字典
+    """
+
+    __slots__ = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._values = operator.attrgetter(*cls.__slots__)
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def from_dict(cls, row: dict):
+        record = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(record, name, row[name])
+        return record
+
+    def to_dict(self) -> dict:
+        return dict(zip(self.__slots__, self._values(self)))
+
+    def keys(self):
+        return self.__slots__
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default) if name in self.__slots__ else default
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class BorrowRecord(Record):
+    """当前借阅"""
+
+    __slots__ = (
+        "title",
+        "author",
+        "location",
+        "borrow_date",
+        "due_date",
+        "cnum",
+        "bar_code",
+        "marc_no",
+    )
+
+
+class HistoryRecord(Record):
+    """历史借阅"""
+
+    __slots__ = (
+        "index",
+        "title",
+        "author",
+        "location",
+        "borrow_date",
+        "return_date",
+        "bar_code",
+        "marc_no",
+    )
+
+
+class FineRecord(Record):
+    """欠款"""
+
+    __slots__ = (
+        "title",
+        "author",
+        "location",
+        "borrow_date",
+        "due_date",
+        "marc_no",
+        "bar_code",
+        "call_no",
+        "payable",
+        "payin",
+        "state",
+    )
+
+
+class SearchHit(Record):
+    """搜索结果"""
+
+    __slots__ = (
+        "type",
+        "title",
+        "author",
+        "publisher",
+        "total_num",
+        "loanable_num",
+        "marc_no",
+        "call_no",
+    )
+
+
+class Holding(Record):
+    """图书详情中的馆藏"""
+
+    __slots__ = (
+        "annual_roll",
+        "location",
+        "return_location",
+        "status",
+        "bar_code",
+        "call_no",
+    )
+
+
+def _json_default(obj):
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    raise TypeError(f"{type(obj).__name__} 无法序列化为 JSON")
+
+
+def dumps(obj) -> bytes:
+    """把结果（可包含 Record）序列化为 UTF-8 编码的 JSON，安装了 orjson 时使用 orjson"""
+    global dumps
+    try:
+        import orjson
+    except ImportError:
+
+        def dumps(obj) -> bytes:
+            return json.dumps(obj, ensure_ascii=False, default=_json_default).encode()
+
+    else:
+
+        def dumps(obj) -> bytes:
+            return orjson.dumps(obj, default=_json_default)
+
+    return dumps(obj)
+
+
+class _ConnectTimer(threading.local):
+    """当前线程新建连接（DNS、TCP 与 TLS 握手）累计耗时，由 Client._request 读取"""
+
+    seconds = 0.0
+
+
+_connect_timer = _ConnectTimer()
+
+
+class _TimedConnectionMixin:
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _connect_timer.seconds += time.perf_counter() - start
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, urllib3.connection.HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, urllib3.connection.HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(requests.adapters.HTTPAdapter):
+    """新建连接时记录建连耗时的 HTTPAdapter，复用 keep-alive 连接时不产生额外开销"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class _RejectCookiePolicy(http.cookiejar.DefaultCookiePolicy):
+    """共享会话不保存也不发送任何 cookie，cookie 由各 Client 自己的 jar 管理"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+class Transport:
+    """
+    可被多个 Client 共享的 HTTP 连接池
+    每个 base_url（scheme://host:port）一个 keep-alive 连接池，pool_size 为单个主机保留的最大连接数，
+    pool_block 为 True 时连接用尽会等待而不是临时新建连接
+    """
+
+    def __init__(self, pool_size: int = 10, pool_block: bool = False):
+        self.pool_size = pool_size
+        self.pool_block = pool_block
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, url):
+        """获取 url 所在主机的共享会话"""
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        sess = self._sessions.get(key)
+        if sess is None:
+            with self._lock:
+                sess = self._sessions.get(key)
+                if sess is None:
+                    sess = requests.Session()
+                    sess.cookies.set_policy(_RejectCookiePolicy())
+                    adapter = TimedHTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=self.pool_size,
+                        pool_block=self.pool_block,
+                    )
+                    sess.mount(key, adapter)
+                    self._sessions[key] = sess
+        return sess
+
+    def request(self, method, url, jar, cookies=None, **kwargs):
+        """使用用户自己的 cookie jar 发起请求，响应中的 Set-Cookie 只写回该 jar"""
+        send_cookies = requests.cookies.merge_cookies(jar.copy(), cookies or {})
+        resp = self.session(url).request(method, url, cookies=send_cookies, **kwargs)
+        for r in resp.history + [resp]:
+            requests.cookies.extract_cookies_to_jar(jar, r.request, r.raw)
+        return resp
+
+    def close(self):
+        with self._lock:
+            for sess in self._sessions.values():
+                sess.close()
+            self._sessions.clear()
+
+
+class _Bucket:
+    """单个主机的令牌桶与各优先级通道的等待队列，调用方需持有 cond"""
+
+    def __init__(self, rate, burst, lanes, window):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.queues = {lane: collections.deque() for lane in lanes}
+        self.acquired = collections.Counter()
+        self.wait_total = collections.Counter()
+        self.waits = {lane: collections.deque(maxlen=window) for lane in lanes}
+        self.cond = threading.Condition()
+
+    def poll(self, ticket, lane):
+        """轮到 ticket 且有令牌时消耗一个令牌并返回 0，否则返回建议的等待秒数"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        head = next(queue[0] for queue in self.queues.values() if queue)
+        if head is not ticket:
+            return 1 / self.rate
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        self.tokens -= 1
+        self.queues[lane].popleft()
+        return 0.0
+
+    def record(self, lane, waited):
+        self.acquired[lane] += 1
+        self.wait_total[lane] += waited
+        self.waits[lane].append(waited)
+        self.cond.notify_all()
+
+    def discard(self, ticket, lane):
+        with contextlib.suppress(ValueError):
+            self.queues[lane].remove(ticket)
+        self.cond.notify_all()
+
+
+class Scheduler:
+    """
+    按主机限速的请求调度器，可被多个 Client / AsyncClient 共享
+    每个主机一个令牌桶：每秒补充 rate 个令牌、最多积攒 burst 个，每个请求消耗一个令牌；
+    lanes 按优先级从高到低排列，有令牌时总是先放行高优先级通道中等待最久的请求
+    limits: 按主机（host:port）单独设置 (rate, burst)
+    window: 每个通道保留最近多少次等待时间用于统计分位数
+    """
+
+    lanes = ("interactive", "bulk")
+
+    def __init__(
+        self,
+        rate: float = 5.0,
+        burst: int = 10,
+        limits: dict = None,
+        lanes=None,
+        window: int = 1024,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.limits = limits or {}
+        if lanes is not None:
+            self.lanes = tuple(lanes)
+        self.window = window
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url, lane):
+        if lane not in self.lanes:
+            raise ValueError(f"未知的优先级通道：{lane}")
+        host = urlsplit(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(host)
+                if bucket is None:
+                    rate, burst = self.limits.get(host, (self.rate, self.burst))
+                    bucket = _Bucket(rate, burst, self.lanes, self.window)
+                    self._buckets[host] = bucket
+        return bucket
+
+    def acquire(self, url, lane: str = "interactive") -> float:
+        """阻塞直到 url 所在主机放行本次请求，返回等待的秒数"""
+        bucket = self.bucket(url, lane)
+        ticket = object()
+        start = time.monotonic()
+        with bucket.cond:
+            bucket.queues[lane].append(ticket)
+            try:
+                delay = bucket.poll(ticket, lane)
+                while delay:
+                    bucket.cond.wait(delay)
+                    delay = bucket.poll(ticket, lane)
+            except BaseException:
+                bucket.discard(ticket, lane)
+                raise
+            waited = time.monotonic() - start
+            bucket.record(lane, waited)
+        return waited
+
+    async def acquire_async(self, url, lane: str = "interactive") -> float:
+        """acquire 的异步版本，等待时不阻塞事件循环"""
+        bucket = self.bucket(url, lane)
+        ticket = object()
+        start = time.monotonic()
+        with bucket.cond:
+            bucket.queues[lane].append(ticket)
+        try:
+            while True:
+                with bucket.cond:
+                    delay = bucket.poll(ticket, lane)
+                    if not delay:
+                        waited = time.monotonic() - start
+                        bucket.record(lane, waited)
+                        return waited
+                import asyncio
+
+                await asyncio.sleep(delay)
+        except BaseException:
+            with bucket.cond:
+                bucket.discard(ticket, lane)
+            raise
+
+    def stats(self) -> dict:
+        """各主机剩余令牌数，以及各通道的排队数、已放行数与等待时间（秒）"""
+        result = {}
+        for host, bucket in list(self._buckets.items()):
+            with bucket.cond:
+                lanes = {}
+                for lane in self.lanes:
+                    waits = sorted(bucket.waits[lane])
+                    acquired = bucket.acquired[lane]
+                    lanes[lane] = {
+                        "depth": len(bucket.queues[lane]),
+                        "acquired": acquired,
+                        "wait_avg": bucket.wait_total[lane] / acquired if acquired else 0.0,
+                        "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+                        "wait_p99": waits[int(len(waits) * 0.99)] if waits else 0.0,
+                        "wait_max": waits[-1] if waits else 0.0,
+                    }
+                result[host] = {"tokens": bucket.tokens, "lanes": lanes}
+        return result
+
+
+def failure_code(e: Exception):
+    """熔断器计入的失败：超时返回 1003，连接错误返回 2333，其余异常返回 None"""
+    if isinstance(e, TIMEOUT_ERRORS):
+        return 1003
+    if isinstance(e, exceptions.ConnectionError) or (
+        aiohttp is not None and isinstance(e, aiohttp.ClientConnectionError)
+    ):
+        return 2333
+    return None
+
+
+class _Circuit:
+    __slots__ = (
+        "state",
+        "failures",
+        "code",
+        "opened_at",
+        "probes",
+        "latencies",
+        "pending",
+        "timeout",
+        "probed_at",
+    )
+
+    def __init__(self, window):
+        self.state = "closed"
+        self.failures = 0
+        self.code = None
+        self.opened_at = 0.0
+        self.probes = 0
+        self.latencies = collections.deque(maxlen=window)
+        self.pending = 0
+        self.timeout = None
+        self.probed_at = 0.0
+
+
+class CircuitBreaker:
+    """
+    按主机的熔断器与自适应超时，可被多个 Client / AsyncClient 共享
+    连续 failure_threshold 次超时或连接错误后熔断，reset_timeout 秒内对该主机的请求直接失败，
+    接口返回与触发熔断的错误相同的 1003 / 2333；之后进入半开状态，只放行 probes 个探测请求，
+    探测成功则恢复，失败则重新熔断；探测请求使用 config 的 timeout，
+    放行后 reset_timeout 秒内没有结果（如被取消）的探测名额自动收回
+    读取超时取最近 window 次响应首字节耗时的 percentile 分位数乘以 factor，
+    限制在 min_timeout 与 config 的 timeout 之间，样本少于 min_samples 时沿用 config 的 timeout；
+    发生超时说明延迟已经变化，丢弃已有样本，重新积累前沿用 config 的 timeout
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        probes: int = 1,
+        percentile: float = 0.99,
+        factor: float = 3.0,
+        min_timeout: float = 1.0,
+        window: int = 200,
+        min_samples: int = 20,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.percentile = percentile
+        self.factor = factor
+        self.min_timeout = min_timeout
+        self.window = window
+        self.min_samples = min_samples
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def circuit(self, url):
+        host = urlsplit(url).netloc
+        circuit = self._circuits.get(host)
+        if circuit is None:
+            with self._lock:
+                circuit = self._circuits.setdefault(host, _Circuit(self.window))
+        return circuit
+
+    def before(self, url):
+        """请求前调用，熔断期间抛出 CircuitOpenError"""
+        circuit = self.circuit(url)
+        with self._lock:
+            if circuit.state == "closed":
+                return
+            now = time.monotonic()
+            retry_after = circuit.opened_at + self.reset_timeout - now
+            if circuit.state == "open" and retry_after <= 0:
+                circuit.state = "half_open"
+                circuit.probes = 0
+            if circuit.state == "half_open" and (
+                circuit.probes >= self.probes
+                and now - circuit.probed_at >= self.reset_timeout
+            ):
+                # 探测请求迟迟没有结果，收回名额
+                circuit.probes = 0
+            if circuit.state == "half_open" and circuit.probes < self.probes:
+                circuit.probes += 1
+                circuit.probed_at = now
+                return
+            raise CircuitOpenError(urlsplit(url).netloc, circuit.code, max(retry_after, 0.0))
+
+    def record(self, url, seconds: float = None, error: Exception = None):
+        """请求结束后调用：seconds 为响应首字节耗时，error 为请求抛出的异常"""
+        circuit = self.circuit(url)
+        code = failure_code(error) if error is not None else None
+        with self._lock:
+            if code is None:
+                circuit.failures = 0
+                if circuit.state == "half_open":
+                    circuit.state = "closed"
+                if seconds is not None:
+                    circuit.latencies.append(seconds)
+                    circuit.pending += 1
+                    count = len(circuit.latencies)
+                    # 每积累 10 个新样本重新计算一次分位数
+                    if count >= self.min_samples and (
+                        circuit.timeout is None or circuit.pending >= 10
+                    ):
+                        latencies = sorted(circuit.latencies)
+                        index = min(int(count * self.percentile), count - 1)
+                        circuit.timeout = self.factor * latencies[index]
+                        circuit.pending = 0
+                return
+            circuit.failures += 1
+            circuit.code = code
+            if code == 1003:
+                circuit.latencies.clear()
+                circuit.pending = 0
+                circuit.timeout = None
+            if circuit.state == "half_open" or circuit.failures >= self.failure_threshold:
+                circuit.state = "open"
+                circuit.opened_at = time.monotonic()
+
+    def release(self, url):
+        """请求被取消、没有结果时调用，收回 before 放行的探测名额"""
+        circuit = self.circuit(url)
+        with self._lock:
+            if circuit.state == "half_open" and circuit.probes > 0:
+                circuit.probes -= 1
+
+    def timeout(self, url, default: float) -> float:
+        """url 所在主机当前的读取超时，不超过 default；半开状态的探测请求使用 default"""
+        circuit = self.circuit(url)
+        timeout = circuit.timeout
+        if timeout is None or circuit.state != "closed":
+            return default
+        return min(max(timeout, self.min_timeout), default)
+
+    def stats(self) -> dict:
+        """各主机的熔断状态、连续失败次数与当前自适应超时"""
+        with self._lock:
+            return {
+                host: {
+                    "state": circuit.state,
+                    "failures": circuit.failures,
+                    "timeout": circuit.timeout,
+                    "samples": len(circuit.latencies),
+                }
+                for host, circuit in self._circuits.items()
+            }
+
+
+class MemoryCache:
+    """进程内 LRU 缓存，最多保存 maxsize 条"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """返回 (value, stored_at)，不存在时返回 None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+        return copy.deepcopy(entry[0]), entry[1]
+
+    def set(self, key, value, stored_at=None):
+        with self._lock:
+            self._data[key] = (copy.deepcopy(value), stored_at or time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SqliteCache:
+    """基于 SQLite 的磁盘缓存，结果以 JSON 保存，超过 maxsize 条时淘汰最久未访问的记录"""
+
+    def __init__(self, path: str, maxsize: int = 100000):
+        self.maxsize = maxsize
+        import sqlite3
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value TEXT, stored_at REAL, accessed_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, stored_at=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (
+                    key,
+                    json.dumps(value, ensure_ascii=False, default=_json_default),
+                    stored_at or now,
+                    now,
+                ),
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class ParseCache:
+    """
+    解析结果缓存：以解析方法与响应正文的摘要为键，正文与之前相同时直接返回之前的解析结果
+    可在多个客户端之间共享，最多保存 maxsize 条；hits / misses 为命中与未命中次数
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.backend = MemoryCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(name, args, kwargs):
+        parts = [name]
+        for arg in (*args, *(v for _, v in sorted(kwargs.items()))):
+            if isinstance(arg, str):
+                arg = arg.encode()
+            if isinstance(arg, bytes):
+                parts.append(hashlib.blake2b(arg, digest_size=16).hexdigest())
+                if isinstance(arg, HtmlBytes):
+                    parts.append(arg.encoding)
+            else:
+                parts.append(repr(arg))
+        return "\x00".join(parts)
+
+    def parse(self, name, func, *args, **kwargs):
+        key = self.make_key(name, args, kwargs)
+        entry = self.backend.get(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            result = func(*args, **kwargs)
+            self.backend.set(key, result)
+            return result
+        with self._lock:
+            self.hits += 1
+        result = entry[0]
+        # 热门借阅的 updated 是获取页面的时间，命中缓存时仍以本次为准
+        if isinstance(result, dict) and isinstance(result.get("data"), dict):
+            if "updated" in result["data"]:
+                result["data"]["updated"] = int(time.time())
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "size": len(self.backend),
+            }
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+class CatalogCache:
+    """
+    无需登录的公共接口（热门借阅、搜索、图书详情）的结果缓存，按接口名 + 参数作为键
+    ttl: 各接口的新鲜期（秒），过期后先返回旧结果，同时只发起一次后台刷新；
+    超过 ttl + max_stale 的结果不再使用，直接重新请求
+    backend: 存储后端，默认 MemoryCache，也可使用 SqliteCache 或任何实现 get/set/delete 的对象
+    只缓存状态码为 1000 的结果；图书馆返回的错误页（HTTP 4xx / 5xx）由客户端转为 2333，不会被缓存
+    """
+
+    default_ttl = {
+        "get_recommendation_books": 3600,
+        "search_book": 600,
+        "get_book_detail": 300,
+    }
+
+    def __init__(self, backend=None, ttl: dict = None, max_stale: float = 86400):
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttl = {**self.default_ttl, **(ttl or {})}
+        self.max_stale = max_stale
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._tasks = set()
+
+    @classmethod
+    def make_key(cls, endpoint, args):
+        return json.dumps([endpoint, *args], ensure_ascii=False)
+
+    def _lookup(self, endpoint, key):
+        """返回 (value, 是否已过期)，无可用结果时返回 (None, True)"""
+        entry = self.backend.get(key)
+        if entry is None:
+            return None, True
+        value, stored_at = entry
+        age = time.time() - stored_at
+        ttl = self.ttl.get(endpoint, 0)
+        if age > ttl + self.max_stale:
+            return None, True
+        return value, age > ttl
+
+    def _claim(self, key):
+        """同一个键同时只允许一个后台刷新"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _release(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def _store(self, key, result):
+        if result.get("code") == 1000:
+            self.backend.set(key, result)
+        return result
+
+    def fetch(self, endpoint, args, loader):
+        key = self.make_key(endpoint, args)
+        value, stale = self._lookup(endpoint, key)
+        if value is None:
+            return self._store(key, loader())
+        if stale and self._claim(key):
+            threading.Thread(
+                target=self._refresh, args=(key, loader), daemon=True
+            ).start()
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            self._store(key, loader())
+        finally:
+            self._release(key)
+
+    async def afetch(self, endpoint, args, loader):
+        key = self.make_key(endpoint, args)
+        value, stale = self._lookup(endpoint, key)
+        if value is None:
+            return self._store(key, await loader())
+        if stale and self._claim(key):
+            import asyncio
+
+            task = asyncio.ensure_future(self._arefresh(key, loader))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return value
+
+    async def _arefresh(self, key, loader):
+        try:
+            self._store(key, await loader())
+        finally:
+            self._release(key)
+
+
+class CatalogIndex:
+    """
+    本地书目索引（SQLite，支持时使用 FTS5 trigram 全文索引），由搜索、图书详情与热门借阅的结果填充
+    传给客户端的 index 参数后，search_book 先查本地索引，不能在本地完整回答时才请求图书馆；
+    也可用 crawl 主动抓取热门借阅与指定检索词
+    只有已知完整抓取过的检索（crawl 抓完了全部页，或在线结果只有一页）才由本地回答，记录在 coverage 表中，
+    本地匹配的书少于当时图书馆给出的总数、或页码超出本地页数时同样交给图书馆，不会截断结果
+    检索方式：isbn 去掉连字符后前缀匹配，索书号 callno 与分类号 coden 前缀匹配，其余为包含匹配；
+    馆藏与可借复本数为写入索引时的数据。与在线检索（onlylendable=yes）一致，只返回有可借复本的书；
+    写入超过 max_age 秒的书与抓取记录不参与检索（由下一次在线检索或详情刷新），max_age 为 None 时不过期
+    """
+
+    # 检索类型与列名的对应关系，asordno（订购号）、series（丛书名）不在索引中，总是请求图书馆
+    searchable = {
+        "title": "title",
+        "author": "author",
+        "keyword": "keyword",
+        "publisher": "publisher",
+        "isbn": "isbn",
+        "callno": "callno",
+        "coden": "coden",
+    }
+    columns = (
+        "type",
+        "title",
+        "author",
+        "publisher",
+        "isbn",
+        "callno",
+        "coden",
+        "keyword",
+        "total_num",
+        "loanable_num",
+    )
+    fts_columns = ("title", "author", "publisher", "keyword")
+
+    def __init__(self, path: str = ":memory:", page_size: int = 20, max_age: float = 86400):
+        self.page_size = page_size
+        self.max_age = max_age
+        import sqlite3
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS catalog (marc_no TEXT PRIMARY KEY, "
+            + ", ".join(f"{column} TEXT" for column in self.columns)
+            + ", updated REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS coverage (type TEXT, content TEXT, count INTEGER, "
+            "updated REAL, PRIMARY KEY (type, content))"
+        )
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5"
+                f"(marc_no UNINDEXED, {', '.join(self.fts_columns)}, tokenize='trigram')"
+            )
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite 未编译 FTS5 或版本低于 3.34 时退化为普通的 LIKE 查询
+            self.fts = False
+        self._conn.commit()
+
+    @staticmethod
+    def normalize_isbn(isbn):
+        found = re.search(r"[\dXx][\dXx-]{8,}[\dXx]", isbn or "")
+        return found.group(0).replace("-", "").upper() if found else None
+
+    def _upsert(self, marc_no, record, keep=()):
+        """写入一本书，None 值不覆盖已有数据，keep 中的列已有数据时保留原值"""
+        record = {k: v for k, v in record.items() if v is not None}
+        columns = ["marc_no", *record, "updated"]
+        updates = [
+            f"{k} = COALESCE(catalog.{k}, excluded.{k})" if k in keep else f"{k} = excluded.{k}"
+            for k in [*record, "updated"]
+        ]
+        self._conn.execute(
+            f"INSERT INTO catalog ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(marc_no) DO UPDATE SET {', '.join(updates)}",
+            [marc_no, *record.values(), time.time()],
+        )
+        if self.fts:
+            self._conn.execute("DELETE FROM catalog_fts WHERE marc_no = ?", (marc_no,))
+            self._conn.execute(
+                f"INSERT INTO catalog_fts SELECT marc_no, {', '.join(self.fts_columns)} "
+                "FROM catalog WHERE marc_no = ?",
+                (marc_no,),
+            )
+
+    def _query(self, type, content):
+        """检索类型对应的列与规范化后的检索词，不能由本地索引回答时返回 (None, None)"""
+        column = self.searchable.get(type)
+        text = (content or "").strip()
+        if column == "isbn":
+            text = text.replace("-", "").upper()
+        if column is None or not text:
+            return None, None
+        return column, text
+
+    def add_coverage(self, type, content, count):
+        """记录 (type, content) 的全部检索结果已写入索引，count 为图书馆给出的结果总数"""
+        column, text = self._query(type, content)
+        if column is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?)",
+                (type, text, int(re.sub(r"\D", "", str(count)) or 0), time.time()),
+            )
+            self._conn.commit()
+
+    def add_search_result(self, type, content, page, data):
+        """写入在线检索某一页的 data；结果只有一页时整个检索已完整，记录抓取范围"""
+        self.add_search_books(data["books"])
+        if page == 1 and data["pages"] == 1:
+            self.add_coverage(type, content, data["count"])
+
+    def add_search_books(self, books):
+        """写入 search_book 返回的 books"""
+        with self._lock:
+            for book in books:
+                if book.get("marc_no"):
+                    self._upsert(
+                        book["marc_no"],
+                        {
+                            "type": book["type"],
+                            "title": book["title"],
+                            "author": book["author"],
+                            "publisher": book["publisher"],
+                            "callno": book["call_no"],
+                            "total_num": book["total_num"],
+                            "loanable_num": book["loanable_num"],
+                        },
+                    )
+            self._conn.commit()
+
+    def add_recommendation_books(self, books):
+        """写入 get_recommendation_books 返回的 books，缺少可借复本数，补充详情后才参与检索"""
+        with self._lock:
+            for book in books:
+                if book.get("marc_no"):
+                    self._upsert(
+                        book["marc_no"],
+                        {
+                            "title": book["title"],
+                            "author": book["author"],
+                            "publisher": book["publisher"],
+                            "callno": book["call_no"],
+                            "total_num": book["total_num"],
+                        },
+                        keep=("title", "author", "publisher", "callno"),
+                    )
+            self._conn.commit()
+
+    def add_book_detail(self, marc_no, detail):
+        """写入 get_book_detail 返回的 data，题名、责任者等以搜索结果中的写法为准"""
+        holdings = detail.get("books", [])
+        with self._lock:
+            self._upsert(
+                marc_no,
+                {
+                    "title": detail.get("title"),
+                    "author": detail.get("author"),
+                    "publisher": detail.get("publisher"),
+                    "isbn": self.normalize_isbn(detail.get("isbn")),
+                    "callno": holdings[0]["call_no"] if holdings else None,
+                    "coden": detail.get("call_no"),
+                    "keyword": detail.get("category"),
+                    "total_num": str(len(holdings)),
+                    "loanable_num": str(sum("可借" in b["status"] for b in holdings)),
+                },
+                keep=("title", "author", "publisher", "callno"),
+            )
+            self._conn.commit()
+
+    def search(self, type, content: str, page: int):
+        """与 search_book 返回相同的结构，不能由本地完整回答时返回 None"""
+        column, text = self._query(type, content)
+        if column is None:
+            return None
+        expected = self._covered(type, text)
+        if expected is None:
+            return None
+        escaped = re.sub(r"([\\%_])", r"\\\1", text)
+        pattern = f"{escaped}%" if column in ("isbn", "callno", "coden") else f"%{escaped}%"
+        # trigram 索引只能加速至少 3 个字符且不带 ESCAPE 的 LIKE
+        if self.fts and column in self.fts_columns and len(text) >= 3 and escaped == text:
+            where = f"marc_no IN (SELECT marc_no FROM catalog_fts WHERE {column} LIKE ?)"
+        else:
+            where = f"{column} LIKE ? ESCAPE '\\'"
+        where += " AND CAST(loanable_num AS INTEGER) > 0"
+        params = (pattern,)
+        if self.max_age is not None:
+            where += " AND updated >= ?"
+            params += (time.time() - self.max_age,)
+        with self._lock:
+            count = self._conn.execute(
+                f"SELECT COUNT(*) FROM catalog WHERE {where}", params
+            ).fetchone()[0]
+            # 本地比抓取时少（可借复本变为 0、记录过期）或页码超出时，本地结果不完整
+            if not count or count < expected:
+                return None
+            pages = -(-count // self.page_size)
+            if page > pages:
+                return None
+            rows = self._conn.execute(
+                "SELECT type, title, author, publisher, total_num, loanable_num, marc_no, callno "
+                f"FROM catalog WHERE {where} ORDER BY title, marc_no LIMIT ? OFFSET ?",
+                (*params, self.page_size, (page - 1) * self.page_size),
+            ).fetchall()
+        fields = (
+            "type",
+            "title",
+            "author",
+            "publisher",
+            "total_num",
+            "loanable_num",
+            "marc_no",
+            "call_no",
+        )
+        return {
+            "code": 1000,
+            "msg": "搜索图书成功",
+            "data": {
+                "type": type,
+                "content": content,
+                "count": str(count),
+                "page": page,
+                "pages": pages,
+                "books": [
+                    {k: v if v is not None else "" for k, v in zip(fields, row)} for row in rows
+                ],
+            },
+        }
+
+    def _covered(self, type, text):
+        """已完整抓取的检索在抓取时的结果总数，没有抓取记录或记录已过期时返回 None"""
+        sql, params = "SELECT count FROM coverage WHERE type = ? AND content = ?", (type, text)
+        if self.max_age is not None:
+            sql += " AND updated >= ?"
+            params += (time.time() - self.max_age,)
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+        return None if row is None else row[0]
+
+    def crawl(self, client, queries=(), max_pages: int = None, details: bool = True):
+        """
+        用同步 Client 抓取热门借阅与 queries 中各 (type, content) 的检索结果写入索引，
+        抓完全部页（没有被 max_pages 截断、没有失败）的检索记录为完整，之后由本地回答；
+        details 为 True 时再逐本获取详情补充 ISBN、分类号、主题词与可借复本数
+        返回抓取到的图书数、详情数与失败的请求数
+        """
+        live = copy.copy(client)
+        live.index = None
+        stats = {"books": 0, "details": 0, "errors": 0}
+        marc_nos = []
+        result = live.get_recommendation_books()
+        if result["code"] == 1000:
+            self.add_recommendation_books(result["data"]["books"])
+            marc_nos += [b["marc_no"] for b in result["data"]["books"]]
+        else:
+            stats["errors"] += 1
+        for type, content in queries:
+            page, pages, complete = 1, 1, False
+            while page <= pages and (max_pages is None or page <= max_pages):
+                result = live.search_book(type, content, page)
+                if result["code"] != 1000:
+                    stats["errors"] += 1
+                    break
+                self.add_search_books(result["data"]["books"])
+                marc_nos += [b["marc_no"] for b in result["data"]["books"]]
+                pages = result["data"]["pages"]
+                complete = page >= pages
+                page += 1
+            if complete:
+                self.add_coverage(type, content, result["data"]["count"])
+        marc_nos = [m for m in dict.fromkeys(marc_nos) if m]
+        stats["books"] = len(marc_nos)
+        if details:
+            for marc_no, result in live.iter_book_details(marc_nos):
+                if result["code"] == 1000:
+                    self.add_book_detail(marc_no, result["data"])
+                    stats["details"] += 1
+                else:
+                    stats["errors"] += 1
+        return stats
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM catalog").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+def count_rows(result) -> int:
+    """结果中的记录条数：data 为列表时取其长度，含 books / items 列表时取其长度，否则为 0"""
+    if not isinstance(result, dict):
+        return 0
+    data = result.get("data")
+    if isinstance(data, list):
+        return len(data)
+    if isinstance(data, dict):
+        for key in ("books", "items"):
+            if isinstance(data.get(key), list):
+                return len(data[key])
+    return 0
+
+
+class Histogram:
+    """Prometheus 风格的直方图，buckets 为各桶上界（秒）"""
+
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    热路径指标，传给客户端的 metrics 参数后开始记录，不传时客户端不做任何计时
+    按请求路径：建连（含 DNS）/ 首字节 / 下载耗时、响应字节数与 HTTP 状态码
+    按接口：解析耗时、记录条数、调用耗时与返回的 code
+    hooks: 每次观测时以事件字典调用的回调，如 StatsdExporter
+    """
+
+    help = {
+        "libsys_request_seconds": "HTTP 请求各阶段耗时",
+        "libsys_requests_total": "HTTP 请求数",
+        "libsys_response_bytes_total": "响应体字节数",
+        "libsys_parse_seconds": "页面解析耗时",
+        "libsys_parse_rows_total": "解析出的记录条数",
+        "libsys_call_seconds": "接口调用耗时",
+        "libsys_calls_total": "接口调用数",
+    }
+
+    def __init__(self, hooks=()):
+        self.hooks = list(hooks)
+        self.histograms = collections.defaultdict(Histogram)
+        self.counters = collections.Counter()
+        self._lock = threading.Lock()
+        self._trace_config = None
+
+    def _emit(self, event, histograms, counters):
+        with self._lock:
+            for key, value in histograms:
+                self.histograms[key].observe(value)
+            for key, value in counters:
+                self.counters[key] += value
+        for hook in self.hooks:
+            hook(event)
+
+    def observe_request(
+        self, path, status, ttfb, download=None, connect=None, dns=None, nbytes=None
+    ):
+        event = {
+            "type": "request",
+            "path": path,
+            "status": status,
+            "dns": dns,
+            "connect": connect,
+            "ttfb": ttfb,
+            "download": download,
+            "bytes": nbytes,
+        }
+        histograms = [
+            (("libsys_request_seconds", (("path", path), ("phase", phase))), event[phase])
+            for phase in ("dns", "connect", "ttfb", "download")
+            if event[phase] is not None
+        ]
+        counters = [(("libsys_requests_total", (("path", path), ("status", str(status)))), 1)]
+        if nbytes is not None:
+            counters.append((("libsys_response_bytes_total", (("path", path),)), nbytes))
+        self._emit(event, histograms, counters)
+
+    def observe_parse(self, parser, seconds, rows):
+        labels = (("parser", parser),)
+        self._emit(
+            {"type": "parse", "parser": parser, "seconds": seconds, "rows": rows},
+            [(("libsys_parse_seconds", labels), seconds)],
+            [(("libsys_parse_rows_total", labels), rows)],
+        )
+
+    def observe_call(self, endpoint, result, seconds):
+        code = result.get("code") if isinstance(result, dict) else None
+        self._emit(
+            {"type": "call", "endpoint": endpoint, "code": code, "seconds": seconds},
+            [(("libsys_call_seconds", (("endpoint", endpoint),)), seconds)],
+            [(("libsys_calls_total", (("endpoint", endpoint), ("code", str(code)))), 1)],
+        )
+
+    def trace_config(self):
+        """AsyncClient 使用的 aiohttp.TraceConfig，把请求开始时刻、DNS 与建连耗时写入 trace_request_ctx"""
+        if self._trace_config is None:
+            import_aiohttp()
+
+            def timer(key, sign):
+                async def on_event(session, ctx, params):
+                    if ctx.trace_request_ctx is not None:
+                        timings = ctx.trace_request_ctx
+                        timings[key] = timings.get(key, 0.0) + sign * time.perf_counter()
+
+                return on_event
+
+            async def on_request_start(session, ctx, params):
+                if ctx.trace_request_ctx is not None:
+                    ctx.trace_request_ctx["start"] = time.perf_counter()
+
+            trace = aiohttp.TraceConfig()
+            trace.on_request_start.append(on_request_start)
+            trace.on_dns_resolvehost_start.append(timer("dns", -1))
+            trace.on_dns_resolvehost_end.append(timer("dns", 1))
+            trace.on_connection_create_start.append(timer("connect", -1))
+            trace.on_connection_create_end.append(timer("connect", 1))
+            self._trace_config = trace
+        return self._trace_config
+
+    def to_prometheus(self) -> str:
+        """以 Prometheus 文本格式导出全部指标"""
+
+        def label_text(labels):
+            return ",".join(f'{k}="{v}"' for k, v in labels)
+
+        with self._lock:
+            histograms = {k: (list(h.counts), h.sum, h.count) for k, h in self.histograms.items()}
+            counters = dict(self.counters)
+        lines = []
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# HELP {name} {self.help.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, n in zip(Histogram.buckets + ("+Inf",), counts):
+                    cumulative += n
+                    le = label_text(labels + (("le", bound),))
+                    lines.append(f"{name}_bucket{{{le}}} {cumulative}")
+                lines.append(f"{name}_sum{{{label_text(labels)}}} {total}")
+                lines.append(f"{name}_count{{{label_text(labels)}}} {count}")
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# HELP {name} {self.help.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{{{label_text(labels)}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class StatsdExporter:
+    """
+    作为 Metrics 的 hook，把每次观测以 StatsD 协议经 UDP 发出
+    标签拼入指标名，如 libsys.request.reader_book_lst_php.ttfb
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8125, prefix: str = "libsys"):
+        self.address = (host, port)
+        self.prefix = prefix
+        import socket
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    @staticmethod
+    def name(value):
+        return re.sub(r"[^0-9A-Za-z_]+", "_", str(value)).strip("_")
+
+    def format(self, event):
+        if event["type"] == "request":
+            name = f"{self.prefix}.request.{self.name(event['path'])}"
+            lines = [f"{name}.status.{event['status']}:1|c"]
+            for phase in ("dns", "connect", "ttfb", "download"):
+                if event[phase] is not None:
+                    lines.append(f"{name}.{phase}:{event[phase] * 1000:.3f}|ms")
+            if event["bytes"] is not None:
+                lines.append(f"{name}.bytes:{event['bytes']}|c")
+        elif event["type"] == "parse":
+            name = f"{self.prefix}.parse.{self.name(event['parser'])}"
+            lines = [f"{name}:{event['seconds'] * 1000:.3f}|ms", f"{name}.rows:{event['rows']}|c"]
+        else:
+            name = f"{self.prefix}.call.{self.name(event['endpoint'])}"
+            lines = [f"{name}:{event['seconds'] * 1000:.3f}|ms", f"{name}.code.{event['code']}:1|c"]
+        return lines
+
+    def __call__(self, event):
+        try:
+            self.sock.sendto("\n".join(self.format(event)).encode(), self.address)
+        except OSError:
+            pass
+
+    def close(self):
+        self.sock.close()
+
+
+class InstrumentedParser:
+    """包装解析器，记录各 parse_* 方法的耗时与解析出的记录条数，其余属性原样转发"""
+
+    def __init__(self, parser, metrics: Metrics):
+        self.parser = parser
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self.parser, name)
+        if not name.startswith("parse_") or not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = attr(*args, **kwargs)
+            self.metrics.observe_parse(name, time.perf_counter() - start, count_rows(result))
+            return result
+
+        return timed
+
+
+# 接口 -> 解析该接口页面的方法，Client.parse 与 OffloadParser 据此把页面交给解析器
+ENDPOINT_PARSERS = {
+    "check_session": "parse_session_valid",
+    "get_info": "parse_info",
+    "get_borrow_list": "parse_borrow_list",
+    "get_borrow_history": "parse_borrow_history",
+    "get_pay_list": "parse_pay_list",
+    "get_pay_detail": "parse_pay_detail",
+    "get_recommendation_books": "parse_recommendation_books",
+    "search_book": "parse_search_book",
+    "get_book_detail": "parse_book_detail",
+}
+
+_worker_parsers = {}
+
+
+def parse_page(parser, method, *args, **kwargs):
+    """
+    纯函数：用解析器的 method 解析页面，不访问网络也不依赖客户端状态，可在子进程中执行
+    parser 为 PARSERS 中的名称或解析器实例，名称对应的实例在每个进程中只创建一次
+    """
+    if isinstance(parser, str):
+        if parser not in _worker_parsers:
+            _worker_parsers[parser] = PARSERS[parser]()
+        parser = _worker_parsers[parser]
+    return getattr(parser, method)(*args, **kwargs)
+
+
+def _warm_worker(parser):
+    # 子进程启动时先导入 pyquery 并解析一次空页面，第一次真正的解析不再承担导入开销
+    parse_page(parser, "parse_session_valid", "<html></html>")
+    extract_text(html_document("<p></p>"))
+
+
+def parse_executor(max_workers: int = None, parser: str = "lxml"):
+    """创建用于解析的进程池，子进程已预先导入解析依赖"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    return ProcessPoolExecutor(max_workers, initializer=_warm_worker, initargs=(parser,))
+
+
+class OffloadParser:
+    """
+    包装解析器，把不小于 min_size 字节的页面交给 executor（通常是 parse_executor 创建的进程池）解析，
+    调用线程只等待结果，不再因解析占用 GIL 而拖慢同进程的其他请求；小页面在本线程解析，省去进程间传输
+    解析器实例随任务一起序列化，自定义解析器需要能被 pickle
+    """
+
+    def __init__(self, parser, executor, min_size: int = 16384):
+        self.parser = parser
+        self.executor = executor
+        self.min_size = min_size
+        self._key = next(
+            (name for name, cls in PARSERS.items() if type(parser) is cls), parser
+        )
+
+    def submit(self, method, *args, **kwargs) -> Future:
+        return self.executor.submit(parse_page, self._key, method, *args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self.parser, name)
+        if not name.startswith("parse_") or not callable(attr):
+            return attr
+
+        def offloaded(*args, **kwargs):
+            if sum(len(a) for a in args if isinstance(a, (str, bytes))) < self.min_size:
+                return attr(*args, **kwargs)
+            return self.submit(name, *args, **kwargs).result()
+
+        return offloaded
+
+
+class RecordParser:
+    """包装解析器，把当前借阅、历史借阅、欠款、搜索结果与馆藏的每一行转换为对应的 Record"""
+
+    # 解析方法 -> (行列表在 data 中的键，None 表示 data 本身即为列表, Record 类型)
+    records = {
+        "parse_borrow_list": ("books", BorrowRecord),
+        "parse_borrow_history": (None, HistoryRecord),
+        "parse_pay_detail": (None, FineRecord),
+        "parse_search_book": ("books", SearchHit),
+        "parse_book_detail": ("books", Holding),
+    }
+
+    def __init__(self, parser):
+        self.parser = parser
+
+    def __getattr__(self, name):
+        attr = getattr(self.parser, name)
+        if name not in self.records:
+            return attr
+        key, record = self.records[name]
+
+        def parse(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if result["code"] == 1000:
+                rows = result["data"] if key is None else result["data"][key]
+                rows[:] = [record.from_dict(row) for row in rows]
+            return result
+
+        return parse
+
+
+class CachingParser:
+    """包装解析器，parse_* 方法的结果经 ParseCache 缓存，其余属性原样转发"""
+
+    def __init__(self, parser, cache: ParseCache):
+        self.parser = parser
+        self.cache = cache
+
+    def __getattr__(self, name):
+        attr = getattr(self.parser, name)
+        if not name.startswith("parse_") or not callable(attr):
+            return attr
+        return functools.partial(self.cache.parse, f"{type(self.parser).__name__}.{name}", attr)
+
+
+class BaseClient:
+    """
+    Client 与 AsyncClient 共用的地址、请求头与工具方法
+    parser: 页面解析引擎，可为 "pyquery"（默认）、"lxml" 或自定义的解析器实例
+    cache: 公共接口的 CatalogCache，可在多个客户端之间共享
+    config: 图书馆地址、超时等配置，不传时读取 config.json
+    metrics: 记录请求、解析与接口调用指标的 Metrics，可在多个客户端之间共享
+    scheduler: 共享的 Scheduler，每个请求发出前先取得所在主机的令牌
+    priority: 该客户端请求所在的优先级通道，后台批量任务应使用 "bulk"
+    breaker: 共享的 CircuitBreaker，图书馆不可用时快速失败并按观测到的延迟调整读取超时
+    index: 本地书目索引 CatalogIndex，搜索先查索引，公共接口的结果会写入索引
+    parse_cache: 共享的 ParseCache，响应正文与之前相同时跳过解析
+    records: 为 True 时借阅、历史、欠款、搜索结果与馆藏的每一行以 Record 而不是字典返回
+    executor: 解析用的 Executor（通常是 parse_executor() 创建的进程池），大页面交给它解析
+    响应正文以 HtmlBytes 交给解析器，编码由所有客户端共用的 decoder 按路径记住
+    """
+
+    decoder = Decoder()
+
+    def __init__(
+        self,
+        cookies={},
+        parser="pyquery",
+        cache: CatalogCache = None,
+        config: Config = None,
+        metrics: Metrics = None,
+        scheduler: Scheduler = None,
+        priority: str = "interactive",
+        breaker: CircuitBreaker = None,
+        index: CatalogIndex = None,
+        parse_cache: ParseCache = None,
+        records: bool = False,
+        executor=None,
+    ):
+        self.config = config if config is not None else default_config()
+        self.login_url = urljoin(self.config.base_url, "/reader/login.php")
+        self.ep_url = urljoin(self.config.base_url, "/reader/ajax_ep.php")
+        self.captcha_url = urljoin(self.config.base_url, "/reader/captcha.php")
+        self.verify_url = urljoin(self.config.base_url, "/reader/redr_verify.php")
+        self.redr_url = urljoin(self.config.base_url, "/reader/redr_con.php")
+        self.redr_result_url = urljoin(self.config.base_url, "/reader/redr_con_result.php")
+        self.info_index_url = urljoin(self.config.base_url, "/reader/redr_info.php")
+        self.info_url = urljoin(self.config.base_url, "/reader/redr_info_rule.php")
+        self.borrow_url = urljoin(self.config.base_url, "/reader/book_lst.php")
+        self.history_url = urljoin(self.config.base_url, "/reader/book_hist.php")
+        self.pay_list_url = urljoin(self.config.base_url, "/reader/account.php")
+        self.pay_detail_url = urljoin(self.config.base_url, "/reader/fine_pec.php")
+        self.top_url = urljoin(self.config.base_url, "/top/top_lend.php?cls_no=ALL")
+        self.search_url = urljoin(self.config.base_url, "/opac/openlink.php")
+        self.detail_url = urljoin(self.config.base_url, "/opac/item.php")
+        self.headers = requests.utils.default_headers()
+        self.headers["Referer"] = self.login_url
+        self.headers.update(HEADERS)
+        self.parser = PARSERS[parser]() if isinstance(parser, str) else parser
+        if executor is not None:
+            self.parser = OffloadParser(self.parser, executor)
+        if records:
+            self.parser = RecordParser(self.parser)
+        if parse_cache is not None:
+            self.parser = CachingParser(self.parser, parse_cache)
+        if metrics is not None:
+            self.parser = InstrumentedParser(self.parser, metrics)
+        self.cache = cache
+        self.metrics = metrics
+        self.scheduler = scheduler
+        self.priority = priority
+        self.breaker = breaker
+        self.index = index
+        self.parse_cache = parse_cache
+        self.executor = executor
+        self.cookies = cookies
+
+    def parse(self, endpoint: str, *pages, **kwargs):
+        """
+        只做解析：把已取得的页面按接口 endpoint 解析为与该接口相同的结果，如
+        client.parse("get_borrow_history", html)、client.parse("search_book", html, "title", "Python", 1)
+        页面可为 str、bytes（按 Decoder 识别编码）或 HtmlBytes
+        """
+        pages = [
+            self.decoder.decode(endpoint, {}, page)
+            if isinstance(page, bytes) and not isinstance(page, HtmlBytes)
+            else page
+            for page in pages
+        ]
+        return getattr(self.parser, ENDPOINT_PARSERS[endpoint])(*pages, **kwargs)
+
+    def login_result(self, csrf_token, uid, sca, password, captcha_pic, cookies):
+        return {
+            "code": 1001,
+            "msg": "获取验证码成功",
+            "data": {
+                "csrf_token": csrf_token,
+                "cookies": cookies,
+                "number": uid,
+                "sca": sca,
+                "password": password,
+                "captcha_pic": captcha_pic,
+            },
+        }
+
+    def login_form(self, csrf_token, number, sca, password, captcha):
+        return {
+            "sca": sca,
+            "number": number,
+            "passwd": self.encode_password(sca, password),
+            "captcha": captcha,
+            "select": "cert_no",
+            "returnUrl": "",
+            "csrf_token": csrf_token,
+        }
+
+    @classmethod
+    def encode_password(cls, sca, password):
+        table = cls.password_table(sca)
+        encode_password = ""
+        for char in password:
+            code = table.get(char)
+            if code is None:
+                code = hex(ord(char))[2:]
+            num1 = int(random.random() * 62)
+            num2 = int(random.random() * 62)
+            encode_password += str(sca[num1]) + str(code) + str(sca[num2])
+        return encode_password
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def password_table(sca):
+        """字符 -> 编码后十六进制的对照表，每个 sca 只构建一次；重复字符以首次出现的位置为准"""
+        return {
+            char: hex(ord(sca[(i + 3) % 62]))[2:]
+            for i, char in reversed(list(enumerate(sca)))
+        }
+
+    @classmethod
+    def check_password(cls, password):
+        if len(password) < 8 and len(password) >= 12:
+            return False
+        if bool(re.search(r"\d", password)) == False:
+            return False
+        if any(x.isupper() for x in password) == False:
+            return False
+        if any(x.islower() for x in password) == False:
+            return False
+        return True
+
+    @classmethod
+    def get_marc_no(cls, content):
+        return PyQueryParser.get_marc_no(content)
+
+
+class Client(BaseClient):
+    """
+    同步客户端
+    transport: 可传入共享的 Transport，多个用户复用连接池，cookies 仍保存在各自的 jar 中；
+    不传时与以往一样每个 Client 独占一个 requests.Session
+    """
+
+    def __init__(
+        self,
+        cookies={},
+        transport: Transport = None,
+        parser="pyquery",
+        cache: CatalogCache = None,
+        config: Config = None,
+        metrics: Metrics = None,
+        scheduler: Scheduler = None,
+        priority: str = "interactive",
+        breaker: CircuitBreaker = None,
+        index: CatalogIndex = None,
+        parse_cache: ParseCache = None,
+        records: bool = False,
+        executor=None,
+    ):
+        super().__init__(
+            cookies,
+            parser,
+            cache,
+            config,
+            metrics,
+            scheduler,
+            priority,
+            breaker,
+            index,
+            parse_cache,
+            records,
+            executor,
+        )
+        self.transport = transport
+        if transport is None:
+            self.sess = requests.Session()
+            self.sess.keep_alive = False
+            # 独立 Session 同样按 config.pool_size 保留连接，设置了 metrics 时记录建连耗时
+            adapter = TimedHTTPAdapter if metrics is not None else requests.adapters.HTTPAdapter
+            self.sess.mount("http://", adapter(pool_maxsize=self.config.pool_size))
+            self.sess.mount("https://", adapter(pool_maxsize=self.config.pool_size))
+            self.jar = self.sess.cookies
+        else:
+            self.sess = None
+            self.jar = requests.cookies.RequestsCookieJar()
+
+    def _send(self, method, url, **kwargs):
+        if self.transport is not None:
+            return self.transport.request(method, url, self.jar, **kwargs)
+        return self.sess.request(method, url, **kwargs)
+
+    def _request(self, method, url, **kwargs):
+        kwargs.setdefault("headers", self.headers)
+        if self.breaker is not None:
+            self.breaker.before(url)
+            timeout = self.breaker.timeout(url, self.config.timeout)
+            if self.config.connect_timeout is not None:
+                timeout = (self.config.connect_timeout, timeout)
+            kwargs.setdefault("timeout", timeout)
+        kwargs.setdefault("timeout", self.config.requests_timeout)
+        if self.scheduler is not None:
+            try:
+                self.scheduler.acquire(url, self.priority)
+            except BaseException:
+                if self.breaker is not None:
+                    self.breaker.release(url)
+                raise
+        if self.breaker is None:
+            resp = self._measure(method, url, **kwargs)
+        else:
+            try:
+                resp = self._measure(method, url, **kwargs)
+            except Exception as e:
+                self.breaker.record(url, error=e)
+                raise
+            except BaseException:
+                self.breaker.release(url)
+                raise
+            self.breaker.record(url, resp.elapsed.total_seconds())
+        # 汇文的错误页与限流页（500、503 等）解析不出任何行，必须当作失败，不能当作空结果返回或缓存
+        resp.raise_for_status()
+        return resp
+
+    def _measure(self, method, url, **kwargs):
+        if self.metrics is None:
+            return self._send(method, url, **kwargs)
+        _connect_timer.seconds = 0.0
+        start = time.perf_counter()
+        resp = self._send(method, url, **kwargs)
+        # 非流式请求返回时响应体已读完，elapsed 为发出请求到收到响应头的耗时
+        total = time.perf_counter() - start
+        ttfb = sum((r.elapsed.total_seconds() for r in resp.history + [resp]), 0.0)
+        stream = kwargs.get("stream", False)
+        self.metrics.observe_request(
+            urlsplit(url).path,
+            resp.status_code,
+            ttfb,
+            download=None if stream else max(total - ttfb, 0.0),
+            connect=_connect_timer.seconds or None,
+            nbytes=None if stream else len(resp.content),
+        )
+        return resp
+
+    def _body(self, resp):
+        """响应正文的原始字节，编码由 decoder 给出，不经过 requests 的字符集探测"""
+        return self.decoder.decode(resp.url, resp.headers, resp.content)
+
+    def _get(self, url, **kwargs):
+        return self._request("GET", url, **kwargs)
+
+    def _post(self, url, **kwargs):
+        return self._request("POST", url, **kwargs)
+
+    @catch_errors("登录")
+    def login(self, uid, password):
+        """登录页"""
+        req_csrf = self._get(self.login_url)
+        csrf_token = self.parser.parse_csrf_token(self._body(req_csrf))
+        # 拿到会话 cookie 后，sca 与验证码互不依赖，同时请求
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future_captcha = executor.submit(self._get, self.captcha_url)
+            req_sca = self._get(self.ep_url)
+            req_captcha = future_captcha.result()
+        sca = self.parser.parse_sca(self._body(req_sca))
+        captcha_pic = base64.b64encode(req_captcha.content).decode()
+        return self.login_result(
+            csrf_token, uid, sca, password, captcha_pic, self.jar.get_dict()
+        )
+
+    @catch_errors("验证码登录")
+    def login_with_captcha(
+        self, csrf_token, cookies, number, sca, password, captcha, **kwargs
+    ):
+        """验证码登录"""
+        req_login = self._post(
+            self.verify_url,
+            cookies=cookies,
+            data=self.login_form(csrf_token, number, sca, password, captcha),
+            allow_redirects=False,
+        )
+        error = self.parser.parse_login_error(self._body(req_login))
+        if error is not None:
+            return error
+        self.cookies = self.jar.get_dict()
+        # 未身份认证
+        if req_login.headers["Location"] == "redr_con.php":
+            return {"code": 1011, "msg": "需要身份认证"}
+        return {
+            "code": 1000,
+            "msg": "登录成功",
+            "data": {"cookies": self.cookies},
+        }
+
+    @catch_errors("身份认证")
+    def ini_verify(self, name, new_password):
+        """初次登录系统的身份认证"""
+        if not self.check_password(new_password):
+            return {"code": 999, "msg": "新密码不符合要求"}
+        req_redr = self._get(self.redr_url, cookies=self.cookies)
+        body = self._body(req_redr)
+        csrf_token = self.parser.parse_verify_csrf_token(body)
+        if "未完成身份认证" in body.text:
+            data = {
+                "csrf_token": csrf_token,
+                "name": name,
+                "new_passwd": new_password,
+                "chk_passwd": new_password,
+            }
+            req_result = self._post(
+                self.redr_result_url, cookies=self.cookies, data=data
+            )
+            return self.parser.parse_verify_result(self._body(req_result))
+        return {"code": 999, "msg": "身份认证时未记录的错误"}
+
+    @catch_errors("检查登录状态")
+    def check_session(self):
+        """只请求读者首页判断 cookies 是否仍有效，有效返回 1000，过期返回 1006"""
+        req_index = self._get(self.info_index_url, cookies=self.cookies)
+        if self.parser.parse_session_valid(self._body(req_index)):
+            return {"code": 1000, "msg": "登录状态有效"}
+        return {"code": 1006, "msg": "登录过期，请重新登录"}
+
+    @catch_errors("获取个人信息")
+    def get_info(self):
+        """获取图书馆个人信息"""
+        # 两个页面互不依赖，同时请求
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future_info = executor.submit(self._get, self.info_url, cookies=self.cookies)
+            req_index = self._get(self.info_index_url, cookies=self.cookies)
+            req_info = future_info.result()
+        return self.parser.parse_info(self._body(req_index), self._body(req_info))
+
+    @catch_errors("获取借阅列表")
+    def get_borrow_list(self):
+        """获取当前借阅列表"""
+        req_borrow = self._get(self.borrow_url, cookies=self.cookies)
+        return self.parser.parse_borrow_list(self._body(req_borrow))
+
+    @catch_errors("获取历史借阅")
+    def get_borrow_history(self):
+        """获取历史借阅列表"""
+        req_history = self._post(
+            self.history_url, cookies=self.cookies, data={"para_string": "all"}
+        )
+        return self.parser.parse_borrow_history(self._body(req_history))
+
+    @catch_errors("同步历史借阅")
+    def sync_borrow_history(self, checkpoint: dict = None):
+        """
+        增量同步历史借阅，只返回检查点之后的新记录及新的检查点；
+        checkpoint 为空时返回全部记录
+        """
+        req_history = self._post(
+            self.history_url,
+            cookies=self.cookies,
+            data={"para_string": "all"},
+            stream=True,
+        )
+        with contextlib.closing(req_history):
+            sync = HistorySync(
+                checkpoint, self.decoder.encoding(req_history.url, req_history.headers)
+            )
+            for chunk in req_history.iter_content(chunk_size=8192):
+                if sync.feed(chunk):
+                    break
+            sync.close()
+        return sync.result()
+
+    @catch_errors("获取账目清单")
+    def get_pay_list(self):
+        """获取账目清单"""
+        req_paylist = self._post(self.pay_list_url, cookies=self.cookies)
+        return self.parser.parse_pay_list(self._body(req_paylist))
+
+    @catch_errors("获取欠款信息")
+    def get_pay_detail(self):
+        """获取欠款记录"""
+        req_paydetail = self._post(self.pay_detail_url, cookies=self.cookies)
+        return self.parser.parse_pay_detail(self._body(req_paydetail))
+
+    @cached("get_recommendation_books")
+    @catch_errors("获取热门借阅")
+    def get_recommendation_books(self):
+        req_popular = self._get(self.top_url)
+        result = self.parser.parse_recommendation_books(self._body(req_popular))
+        if self.index is not None and result["code"] == 1000:
+            self.index.add_recommendation_books(result["data"]["books"])
+        return result
+
+    @cached("search_book")
+    @catch_errors("搜索图书")
+    def search_book(self, type, content: str, page: int):
+        """
+        搜索图书
+        type: 书名-title 作者-author 主题词-keyword ISBN/ISSN-isbn 订购号-asordno 分类号-coden 索书号-callno 出版社-publisher 丛书名-series
+        设置了 index 时先查本地索引
+        """
+        if self.index is not None:
+            result = self.index.search(type, content, page)
+            if result is not None:
+                return result
+        data = {
+            "onlylendable": "yes",
+            type: content,
+            "page": page,
+        }
+        req_search = self._get(self.search_url, params=data)
+        result = self.parser.parse_search_book(self._body(req_search), type, content, page)
+        if self.index is not None and result["code"] == 1000:
+            self.index.add_search_result(type, content, page, result["data"])
+        return result
+
+    @cached("get_book_detail")
+    @catch_errors("获取图书详情")
+    def get_book_detail(self, marc_no: str):
+        """获取图书详情"""
+        req_detail = self._get(self.detail_url, params={"marc_no": marc_no})
+        result = self.parser.parse_book_detail(self._body(req_detail))
+        if self.index is not None and result["code"] == 1000:
+            self.index.add_book_detail(marc_no, result["data"])
+        return result
+
+    def iter_search_book(self, type, content: str, prefetch: int = 2):
+        """
+        逐本产出全部搜索结果，消费当前页时后台预取后续 prefetch 页，
+        提前 break 即停止预取；某页获取失败时抛出 LibsysError
+        """
+        first = self.search_book(type, content, 1)
+        if first["code"] != 1000:
+            raise LibsysError(first)
+        pages = first["data"]["pages"]
+        window = max(prefetch, 1)
+        executor = ThreadPoolExecutor(max_workers=window)
+        pending = collections.deque()
+        next_page = 2
+
+        def fill():
+            nonlocal next_page
+            while next_page <= pages and len(pending) < window:
+                pending.append(
+                    executor.submit(self.search_book, type, content, next_page)
+                )
+                next_page += 1
+
+        try:
+            fill()
+            yield from first["data"]["books"]
+            while pending:
+                result = pending.popleft().result()
+                fill()
+                if result["code"] != 1000:
+                    raise LibsysError(result)
+                yield from result["data"]["books"]
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_book_details(self, marc_nos, concurrency: int = 8):
+        """
+        批量获取图书详情，marc_no 去重后以最多 concurrency 个并发请求获取，
+        按完成顺序逐个产出 (marc_no, 结果)，单本失败只体现在该本的状态码上
+        """
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        futures = {
+            executor.submit(self.get_book_detail, marc_no): marc_no
+            for marc_no in dict.fromkeys(marc_nos)
+        }
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_book_details(self, marc_nos, concurrency: int = 8):
+        """批量获取图书详情，返回以 marc_no 为键的各本结果"""
+        return {
+            "code": 1000,
+            "msg": "批量获取图书详情成功",
+            "data": dict(self.iter_book_details(marc_nos, concurrency)),
+        }
+
 
+class AsyncClient(BaseClient):
+    """
+    基于 aiohttp 的异步客户端，方法名、返回结构与状态码均与 Client 一致
+    connector: 可传入共享的 aiohttp.TCPConnector，多个用户共用连接池而各自保留 cookies
+    """
 
-BASE_URL = get_config("library", "base_url")
-TIMEOUT = get_config("request", "timeout")
+    def __init__(
+        self,
+        cookies={},
+        connector=None,
+        parser="pyquery",
+        cache: CatalogCache = None,
+        config: Config = None,
+        metrics: Metrics = None,
+        scheduler: Scheduler = None,
+        priority: str = "interactive",
+        breaker: CircuitBreaker = None,
+        index: CatalogIndex = None,
+        parse_cache: ParseCache = None,
+        records: bool = False,
+        executor=None,
+    ):
+        import_aiohttp()
+        super().__init__(
+            cookies,
+            parser,
+            cache,
+            config,
+            metrics,
+            scheduler,
+            priority,
+            breaker,
+            index,
+            parse_cache,
+            records,
+            executor,
+        )
+        self.connector = connector
+        self.sess = None
 
+    async def __aenter__(self):
+        return self
 
-class Client:
-    def __init__(self, cookies={}):
-        self.login_url = urljoin(BASE_URL, "/reader/login.php")
-        self.ep_url = urljoin(BASE_URL, "/reader/ajax_ep.php")
-        self.captcha_url = urljoin(BASE_URL, "/reader/captcha.php")
-        self.verify_url = urljoin(BASE_URL, "/reader/redr_verify.php")
-        self.redr_url = urljoin(BASE_URL, "/reader/redr_con.php")
-        self.redr_result_url = urljoin(BASE_URL, "/reader/redr_con_result.php")
-        self.headers = requests.utils.default_headers()
-        self.headers["Referer"] = self.login_url
-        self.headers[
-            "User-Agent"
-        ] = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/56.0.2924.87 Safari/537.36"
-        self.headers[
-            "Accept"
-        ] = "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3"
-        self.sess = requests.Session()
-        self.sess.keep_alive = False
-        self.cookies = cookies
+    async def __aexit__(self, *exc):
+        await self.close()
 
-    def login(self, uid, password):
-        """登录页"""
-        try:
-            req_csrf = self.sess.get(
-                self.login_url, headers=self.headers, timeout=TIMEOUT
+    def _session(self):
+        # aiohttp 的会话需在事件循环内创建
+        if self.sess is None or self.sess.closed:
+            self.sess = aiohttp.ClientSession(
+                headers=dict(self.headers),
+                timeout=aiohttp.ClientTimeout(
+                    total=self.config.timeout, sock_connect=self.config.connect_timeout
+                ),
+                connector=self.connector
+                or aiohttp.TCPConnector(limit_per_host=self.config.pool_size),
+                connector_owner=self.connector is None,
+                cookie_jar=aiohttp.CookieJar(unsafe=True),
+                trace_configs=(
+                    [self.metrics.trace_config()] if self.metrics is not None else None
+                ),
             )
-            doc_csrf = pq(req_csrf.text)
-            csrf_token = doc_csrf("input[name='csrf_token']").attr("value")
-            req_sca = self.sess.get(self.ep_url, headers=self.headers, timeout=TIMEOUT)
-            sca = re.findall(r"setAttribute\(\"value\"\,\"(.*)\"\);", req_sca.text)[0]
-            req_captcha = self.sess.get(
-                self.captcha_url, headers=self.headers, timeout=TIMEOUT
+        return self.sess
+
+    def _session_cookies(self):
+        return {c.key: c.value for c in self._session().cookie_jar}
+
+    @contextlib.asynccontextmanager
+    async def _open(self, method, url, **kwargs):
+        """
+        经过调度器与熔断器发出请求，收到响应头后交给调用方读取；
+        设置了 metrics 时在调用方读完响应后记录耗时与字节数，错误页在抛出前记录
+        """
+        timings = None
+        if self.metrics is not None:
+            timings = kwargs["trace_request_ctx"] = {}
+        if self.breaker is not None:
+            self.breaker.before(url)
+            kwargs.setdefault(
+                "timeout",
+                aiohttp.ClientTimeout(
+                    total=self.config.timeout,
+                    sock_connect=self.config.connect_timeout,
+                    sock_read=self.breaker.timeout(url, self.config.timeout),
+                ),
             )
-            captcha_pic = base64.b64encode(req_captcha.content).decode()
-            return {
-                "code": 1001,
-                "msg": "获取验证码成功",
-                "data": {
-                    "csrf_token": csrf_token,
-                    "cookies": self.sess.cookies.get_dict(),
-                    "number": uid,
-                    "sca": sca,
-                    "password": password,
-                    "captcha_pic": captcha_pic,
-                },
-            }
-        except exceptions.Timeout:
-            return {"code": 1003, "msg": "登录超时"}
-        except (
-            exceptions.RequestException,
-            json.decoder.JSONDecodeError,
-            AttributeError,
-        ):
-            traceback.print_exc()
-            return {"code": 2333, "msg": "连接错误：图书馆系统可能无法正常访问"}
+        if self.scheduler is not None:
+            try:
+                await self.scheduler.acquire_async(url, self.priority)
+            except BaseException:
+                # 等待令牌时被取消，收回熔断器放行的探测名额
+                if self.breaker is not None:
+                    self.breaker.release(url)
+                raise
+        if self.breaker is None:
+            async with self._session().request(method, url, **kwargs) as resp:
+                ttfb = self._received(url, resp, timings)
+                yield resp
+                self._observe(url, resp, timings, ttfb)
+            return
+        start = time.perf_counter()
+        recorded = False
+        try:
+            async with self._session().request(method, url, **kwargs) as resp:
+                self.breaker.record(url, time.perf_counter() - start)
+                recorded = True
+                ttfb = self._received(url, resp, timings)
+                yield resp
+                self._observe(url, resp, timings, ttfb)
         except Exception as e:
-            traceback.print_exc()
-            return {"code": 999, "msg": f"登录时未记录的错误：{str(e)}"}
+            # 响应头之后的异常只有超时与连接错误计入失败
+            if not recorded or failure_code(e) is not None:
+                self.breaker.record(url, error=e)
+            raise
+        except BaseException:
+            if not recorded:
+                self.breaker.release(url)
+            raise
 
-    def login_with_captcha(
+    def _received(self, url, resp, timings):
+        """收到响应头时调用，返回 ttfb；同 Client._request，错误页不能当作空结果，记录后抛出"""
+        ttfb = None if timings is None else time.perf_counter() - timings["start"]
+        if resp.status >= 400:
+            self._observe(url, resp, timings, ttfb, read=False)
+            resp.raise_for_status()
+        return ttfb
+
+    def _observe(self, url, resp, timings, ttfb, read=True):
+        if timings is None:
+            return
+        self.metrics.observe_request(
+            urlsplit(url).path,
+            resp.status,
+            ttfb,
+            download=time.perf_counter() - timings["start"] - ttfb if read else None,
+            connect=timings.get("connect"),
+            dns=timings.get("dns"),
+            nbytes=resp.content.total_bytes if read else None,
+        )
+
+    async def _request(self, method, url, read=False, **kwargs):
+        async with self._open(method, url, **kwargs) as resp:
+            body = await resp.read()
+        return body if read else self.decoder.decode(str(resp.url), resp.headers, body)
+
+    async def _parse(self, method, *args):
+        """设置了 executor 时在线程中等待解析结果，事件循环不被解析阻塞"""
+        parse = getattr(self.parser, method)
+        if self.executor is None:
+            return parse(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, parse, *args)
+
+    async def _get(self, url, read=False, **kwargs):
+        return await self._request("GET", url, read, **kwargs)
+
+    async def _post(self, url, **kwargs):
+        return await self._request("POST", url, **kwargs)
+
+    async def close(self):
+        if self.sess is not None:
+            await self.sess.close()
+
+    @catch_errors("登录")
+    async def login(self, uid, password):
+        """登录页"""
+        csrf_token = self.parser.parse_csrf_token(await self._get(self.login_url))
+        ep_text, captcha = await asyncio.gather(
+            self._get(self.ep_url), self._get(self.captcha_url, read=True)
+        )
+        sca = self.parser.parse_sca(ep_text)
+        captcha_pic = base64.b64encode(captcha).decode()
+        return self.login_result(
+            csrf_token, uid, sca, password, captcha_pic, self._session_cookies()
+        )
+
+    @catch_errors("验证码登录")
+    async def login_with_captcha(
         self, csrf_token, cookies, number, sca, password, captcha, **kwargs
     ):
         """验证码登录"""
-        try:
+        async with self._open(
+            "POST",
+            self.verify_url,
+            cookies=cookies,
+            data=self.login_form(csrf_token, number, sca, password, captcha),
+            allow_redirects=False,
+        ) as req_login:
+            text = self.decoder.decode(
+                str(req_login.url), req_login.headers, await req_login.read()
+            )
+            location = req_login.headers["Location"]
+        error = self.parser.parse_login_error(text)
+        if error is not None:
+            return error
+        self.cookies = self._session_cookies()
+        # 未身份认证
+        if location == "redr_con.php":
+            return {"code": 1011, "msg": "需要身份认证"}
+        return {
+            "code": 1000,
+            "msg": "登录成功",
+            "data": {"cookies": self.cookies},
+        }
+
+    @catch_errors("身份认证")
+    async def ini_verify(self, name, new_password):
+        """初次登录系统的身份认证"""
+        if not self.check_password(new_password):
+            return {"code": 999, "msg": "新密码不符合要求"}
+        text = await self._get(self.redr_url, cookies=self.cookies)
+        csrf_token = self.parser.parse_verify_csrf_token(text)
+        if "未完成身份认证" in text.text:
             data = {
-                "sca": sca,
-                "number": number,
-                "passwd": self.encode_password(sca, password),
-                "captcha": captcha,
-                "select": "cert_no",
-                "returnUrl": "",
                 "csrf_token": csrf_token,
+                "name": name,
+                "new_passwd": new_password,
+                "chk_passwd": new_password,
             }
-            req_login = self.sess.post(
-                self.verify_url,
-                headers=self.headers,
-                cookies=cookies,
-                data=data,
-                timeout=TIMEOUT,
-                allow_redirects=False,
+            text = await self._post(self.redr_result_url, cookies=self.cookies, data=data)
+            return self.parser.parse_verify_result(text)
+        return {"code": 999, "msg": "身份认证时未记录的错误"}
+
+    @catch_errors("检查登录状态")
+    async def check_session(self):
+        """只请求读者首页判断 cookies 是否仍有效，有效返回 1000，过期返回 1006"""
+        text = await self._get(self.info_index_url, cookies=self.cookies)
+        if await self._parse("parse_session_valid", text):
+            return {"code": 1000, "msg": "登录状态有效"}
+        return {"code": 1006, "msg": "登录过期，请重新登录"}
+
+    @catch_errors("获取个人信息")
+    async def get_info(self):
+        """获取图书馆个人信息"""
+        index_text, info_text = await asyncio.gather(
+            self._get(self.info_index_url, cookies=self.cookies),
+            self._get(self.info_url, cookies=self.cookies),
+        )
+        return await self._parse("parse_info", index_text, info_text)
+
+    @catch_errors("获取借阅列表")
+    async def get_borrow_list(self):
+        """获取当前借阅列表"""
+        text = await self._get(self.borrow_url, cookies=self.cookies)
+        return await self._parse("parse_borrow_list", text)
+
+    @catch_errors("获取历史借阅")
+    async def get_borrow_history(self):
+        """获取历史借阅列表"""
+        text = await self._post(
+            self.history_url, cookies=self.cookies, data={"para_string": "all"}
+        )
+        return await self._parse("parse_borrow_history", text)
+
+    @catch_errors("同步历史借阅")
+    async def sync_borrow_history(self, checkpoint: dict = None):
+        """增量同步历史借阅，行为同 Client.sync_borrow_history"""
+        async with self._open(
+            "POST", self.history_url, cookies=self.cookies, data={"para_string": "all"}
+        ) as resp:
+            sync = HistorySync(
+                checkpoint, self.decoder.encoding(str(resp.url), resp.headers)
             )
-            doc = pq(req_login.text)
-            error = doc("font#fontMsg[color='red']")
-            if error.text() != "":
-                error_msg = error.text()
-                if "用户名或密码错误" in error_msg:
-                    return {"code": 1002, "msg": "用户名或密码不正确"}
-                if "验证码" in error_msg:
-                    return {"code": 1004, "msg": "验证码输入错误"}
-                return {"code": 999, "msg": "错误：" + error_msg}
-            self.cookies = self.sess.cookies.get_dict()
-            # 未身份认证
-            if req_login.headers["Location"] == "redr_con.php":
-                return {"code": 1011, "msg": "需要身份认证"}
-            return {
-                "code": 1000,
-                "msg": "登录成功",
-                "data": {"cookies": self.cookies},
-            }
-        except exceptions.Timeout:
-            return {"code": 1003, "msg": "验证码登录超时"}
-        except (
-            exceptions.RequestException,
-            json.decoder.JSONDecodeError,
-            AttributeError,
-        ):
-            traceback.print_exc()
-            return {"code": 2333, "msg": "连接错误：图书馆系统可能无法正常访问"}
-        except Exception as e:
-            traceback.print_exc()
-            return {"code": 999, "msg": f"验证码登录时未记录的错误：{str(e)}"}
+            async for chunk in resp.content.iter_chunked(8192):
+                if sync.feed(chunk):
+                    break
+            sync.close()
+        return sync.result()
+
+    @catch_errors("获取账目清单")
+    async def get_pay_list(self):
+        """获取账目清单"""
+        text = await self._post(self.pay_list_url, cookies=self.cookies)
+        return await self._parse("parse_pay_list", text)
+
+    @catch_errors("获取欠款信息")
+    async def get_pay_detail(self):
+        """获取欠款记录"""
+        text = await self._post(self.pay_detail_url, cookies=self.cookies)
+        return await self._parse("parse_pay_detail", text)
+
+    @cached("get_recommendation_books")
+    @catch_errors("获取热门借阅")
+    async def get_recommendation_books(self):
+        text = await self._get(self.top_url)
+        result = await self._parse("parse_recommendation_books", text)
+        if self.index is not None and result["code"] == 1000:
+            self.index.add_recommendation_books(result["data"]["books"])
+        return result
+
+    @cached("search_book")
+    @catch_errors("搜索图书")
+    async def search_book(self, type, content: str, page: int):
+        """搜索图书，type 取值同 Client.search_book，设置了 index 时先查本地索引"""
+        if self.index is not None:
+            result = self.index.search(type, content, page)
+            if result is not None:
+                return result
+        data = {
+            "onlylendable": "yes",
+            type: content,
+            "page": page,
+        }
+        text = await self._get(self.search_url, params=data)
+        result = await self._parse("parse_search_book", text, type, content, page)
+        if self.index is not None and result["code"] == 1000:
+            self.index.add_search_result(type, content, page, result["data"])
+        return result
+
+    @cached("get_book_detail")
+    @catch_errors("获取图书详情")
+    async def get_book_detail(self, marc_no: str):
+        """获取图书详情"""
+        text = await self._get(self.detail_url, params={"marc_no": marc_no})
+        result = await self._parse("parse_book_detail", text)
+        if self.index is not None and result["code"] == 1000:
+            self.index.add_book_detail(marc_no, result["data"])
+        return result
+
+    async def iter_search_book(self, type, content: str, prefetch: int = 2):
+        """逐本产出全部搜索结果，行为同 Client.iter_search_book，为异步生成器"""
+        first = await self.search_book(type, content, 1)
+        if first["code"] != 1000:
+            raise LibsysError(first)
+        pages = first["data"]["pages"]
+        window = max(prefetch, 1)
+        pending = collections.deque()
+        next_page = 2
+
+        def fill():
+            nonlocal next_page
+            while next_page <= pages and len(pending) < window:
+                pending.append(
+                    asyncio.ensure_future(self.search_book(type, content, next_page))
+                )
+                next_page += 1
 
-    def ini_verify(self, name, new_password):
-        """初次登录系统的身份认证"""
         try:
-            if not self.check_password(new_password):
-                return {"code": 999, "msg": "新密码不符合要求"}
-            req_redr = self.sess.get(
-                self.redr_url,
-                headers=self.headers,
-                cookies=self.cookies,
-                timeout=TIMEOUT,
-            )
-            doc_csrf = pq(req_redr.text)
-            csrf_token = doc_csrf("input#csrf_token").attr("value")
-            if "未完成身份认证" in req_redr.text:
-                data = {
-                    "csrf_token": csrf_token,
-                    "name": name,
-                    "new_passwd": new_password,
-                    "chk_passwd": new_password,
-                }
-                req_result = self.sess.post(
-                    self.redr_result_url,
-                    headers=self.headers,
-                    cookies=self.cookies,
-                    data=data,
-                    timeout=TIMEOUT,
+            fill()
+            for book in first["data"]["books"]:
+                yield book
+            while pending:
+                result = await pending.popleft()
+                fill()
+                if result["code"] != 1000:
+                    raise LibsysError(result)
+                for book in result["data"]["books"]:
+                    yield book
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def iter_book_details(self, marc_nos, concurrency: int = 8):
+        """
+        批量获取图书详情，行为同 Client.iter_book_details，为异步生成器
+        提前 break 时请用 contextlib.aclosing 包裹，以便立即取消未完成的请求
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(marc_no):
+            async with semaphore:
+                return marc_no, await self.get_book_detail(marc_no)
+
+        tasks = [asyncio.ensure_future(fetch(m)) for m in dict.fromkeys(marc_nos)]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield await done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def get_book_details(self, marc_nos, concurrency: int = 8):
+        """批量获取图书详情，返回以 marc_no 为键的各本结果"""
+        return {
+            "code": 1000,
+            "msg": "批量获取图书详情成功",
+            "data": {
+                marc_no: result
+                async for marc_no, result in self.iter_book_details(
+                    marc_nos, concurrency
                 )
-                doc = pq(req_result.text)
-                tips = doc(".iconerr")
-                if str(tips) != "" and "密码修改成功" in tips.text():
-                    return {"code": 1000, "msg": "密码修改成功，请重新登录"}
-                error = doc("font[color='red']")
-                if error.text() != "":
-                    error_msg = error.text()
-                    if "身份验证失败" in error_msg:
-                        return {"code": 999, "msg": "姓名不匹配，身份验证失败"}
-                    return {"code": 998, "msg": "错误：" + error_msg}
-                return {"code": 999, "msg": "身份认证时未记录的错误"}
-            return {"code": 999, "msg": "身份认证时未记录的错误"}
-        except exceptions.Timeout:
-            return {"code": 1003, "msg": "身份认证超时"}
-        except (
-            exceptions.RequestException,
-            json.decoder.JSONDecodeError,
-            AttributeError,
-        ):
-            traceback.print_exc()
-            return {"code": 2333, "msg": "连接错误：图书馆系统可能无法正常访问"}
-        except Exception as e:
-            traceback.print_exc()
-            return {"code": 999, "msg": f"身份认证时未记录的错误：{str(e)}"}
+            },
+        }
 
-    def get_info(self):
-        """获取图书馆个人信息"""
-        url_index = urljoin(BASE_URL, "/reader/redr_info.php")
-        url_info = urljoin(BASE_URL, "/reader/redr_info_rule.php")
+
+class Tenant:
+    """
+    一个汇文图书馆（租户）的配置与共享资源：连接池、公共接口缓存与并发上限
+    max_concurrency: 该租户同时执行的任务数上限，同时也是其连接池大小
+    metrics: 该租户所有客户端共用的 Metrics
+    scheduler: 该租户所有客户端共用的 Scheduler，限制对其图书馆的请求速率
+    breaker: 该租户所有客户端共用的 CircuitBreaker
+    index: 该租户的本地书目索引 CatalogIndex
+    parse_cache: 该租户所有客户端共用的 ParseCache
+    executor: 该租户所有客户端共用的解析进程池
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: Config,
+        max_concurrency: int = 8,
+        transport: Transport = None,
+        cache: CatalogCache = None,
+        parser="pyquery",
+        metrics: Metrics = None,
+        scheduler: Scheduler = None,
+        breaker: CircuitBreaker = None,
+        index: CatalogIndex = None,
+        parse_cache: ParseCache = None,
+        executor=None,
+    ):
+        self.name = name
+        self.config = config
+        self.max_concurrency = max_concurrency
+        self.transport = transport or Transport(pool_size=max_concurrency)
+        self.cache = cache if cache is not None else CatalogCache()
+        self.parser = parser
+        self.metrics = metrics
+        self.scheduler = scheduler
+        self.breaker = breaker
+        self.index = index
+        self.parse_cache = parse_cache
+        self.executor = executor
+        self.connector = None
+        self.queue = collections.deque()
+        self.active = 0
+
+    def client(self, cookies={}, priority="interactive"):
+        return Client(
+            cookies,
+            transport=self.transport,
+            parser=self.parser,
+            cache=self.cache,
+            config=self.config,
+            metrics=self.metrics,
+            scheduler=self.scheduler,
+            priority=priority,
+            breaker=self.breaker,
+            index=self.index,
+            parse_cache=self.parse_cache,
+            executor=self.executor,
+        )
+
+    def async_client(self, cookies={}, priority="interactive"):
+        """需在事件循环内调用，同一租户的异步客户端共用一个连接数受限的连接池"""
+        import_aiohttp()
+        if self.connector is None or self.connector.closed:
+            self.connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        return AsyncClient(
+            cookies,
+            connector=self.connector,
+            parser=self.parser,
+            cache=self.cache,
+            config=self.config,
+            metrics=self.metrics,
+            scheduler=self.scheduler,
+            priority=priority,
+            breaker=self.breaker,
+            index=self.index,
+            parse_cache=self.parse_cache,
+            executor=self.executor,
+        )
+
+
+class TenantRegistry:
+    """
+    多租户注册表：一个进程内同时服务多个图书馆
+    所有租户共用一个 max_workers 大小的线程池，但每个租户最多只占用 max_concurrency 个线程，
+    其余任务在该租户自己的队列中等待，某个图书馆变慢不会占满线程池而拖累其它租户
+    """
+
+    def __init__(self, max_workers: int = 32):
+        self._tenants = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+
+    def register(self, name: str, config, **kwargs):
+        """注册租户，config 可以是 Config 或 base_url，其余参数同 Tenant"""
+        if isinstance(config, str):
+            config = Config(config)
+        tenant = Tenant(name, config, **kwargs)
+        with self._lock:
+            self._tenants[name] = tenant
+        return tenant
+
+    def get(self, name: str):
+        return self._tenants[name]
+
+    def __contains__(self, name):
+        return name in self._tenants
+
+    def client(self, name: str, cookies={}, priority="interactive"):
+        return self.get(name).client(cookies, priority)
+
+    def async_client(self, name: str, cookies={}, priority="interactive"):
+        return self.get(name).async_client(cookies, priority)
+
+    def submit(self, name: str, func, *args, **kwargs):
+        """在共享线程池中为租户 name 执行 func，返回 Future"""
+        tenant = self.get(name)
+        future = Future()
+        with self._lock:
+            tenant.queue.append((future, func, args, kwargs))
+        self._dispatch(tenant)
+        return future
+
+    def call(self, name: str, method: str, *args, cookies={}, priority="interactive"):
+        """以租户的客户端调用接口，如 registry.call("njupt", "get_borrow_list", cookies=...)"""
+        return self.submit(
+            name, lambda: getattr(self.client(name, cookies, priority), method)(*args)
+        )
+
+    def _dispatch(self, tenant):
+        with self._lock:
+            while tenant.active < tenant.max_concurrency and tenant.queue:
+                item = tenant.queue.popleft()
+                tenant.active += 1
+                self._executor.submit(self._run, tenant, item)
+
+    def _run(self, tenant, item):
+        future, func, args, kwargs = item
         try:
-            req_index = self.sess.get(
-                url_index,
-                headers=self.headers,
-                cookies=self.cookies,
-                timeout=TIMEOUT,
-            )
-            doc_index = pq(req_index.text)
-            if doc_index("h5.box_bgcolor").text() == "登录我的图书馆":
-                return {"code": 1006, "msg": "登录过期，请重新登录"}
-            access_list = [
-                n.text().replace(" ", "") for n in doc_index(".bigger-170").items()
-            ]
-            max_borrow = access_list[0]
-            max_order = access_list[1]
-            max_entrust = access_list[2]
-            overdue = doc_index("span.infobox-data-number:first").text()
-            percent = doc_index(".Num").text()
-            req_info = self.sess.get(
-                url_info,
-                headers=self.headers,
-                cookies=self.cookies,
-                timeout=TIMEOUT,
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                tenant.active -= 1
+            self._dispatch(tenant)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for tenant in self._tenants.values():
+            tenant.transport.close()
+
+
+class MemorySessionStore:
+    """进程内的登录状态存储：用户 -> (cookies, 最近一次确认有效的时间)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, user):
+        """返回 (cookies, validated_at)，不存在时返回 None"""
+        with self._lock:
+            entry = self._data.get(user)
+        return (dict(entry[0]), entry[1]) if entry else None
+
+    def set(self, user, cookies, validated_at=None):
+        with self._lock:
+            self._data[user] = (dict(cookies), validated_at or time.time())
+
+    def delete(self, user):
+        with self._lock:
+            self._data.pop(user, None)
+
+
+class SqliteSessionStore:
+    """基于 SQLite 的登录状态存储，进程重启后仍可复用 cookies"""
+
+    def __init__(self, path: str):
+        import sqlite3
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(user TEXT PRIMARY KEY, cookies TEXT, validated_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, user):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cookies, validated_at FROM sessions WHERE user = ?", (user,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, user, cookies, validated_at=None):
+        with self._lock:
+            self._conn.execute(
+                "REPLACE INTO sessions VALUES (?, ?, ?)",
+                (user, json.dumps(cookies), validated_at or time.time()),
             )
-            doc_info = pq(req_info.text)
-            trs = list(doc_info("div#mylib_info tr").items())
-            info_list = []
-            # TODO: 优化
-            for i in range(9):
-                tr = trs[i].text()
-                detail_list = re.findall(r"：(.*)", str(tr))
-                for j in detail_list:
-                    info_list.append(j)
-            result = {
-                "name": info_list[0],
-                "cert_start": info_list[4],
-                "cert_work": info_list[5],
-                "cert_end": info_list[3],
-                "max_borrow": max_borrow,
-                "max_order": max_order,
-                "max_entrust": max_entrust,
-                "overdue": overdue,
-                "type": info_list[9],
-                "level": info_list[10],
-                "cumulative_borrow": info_list[11],
-                "violation_num": info_list[12],
-                "violation_money": info_list[13],
-                "sex": info_list[20],
-                "deposit": info_list[27],
-                "charge": info_list[28],
-                "percent": percent,
-            }
-            return {"code": 1000, "msg": "获取个人信息成功", "data": result}
-        except exceptions.Timeout:
-            return {"code": 1003, "msg": "获取个人信息超时"}
-        except (
-            exceptions.RequestException,
-            json.decoder.JSONDecodeError,
-            AttributeError,
-        ):
-            traceback.print_exc()
-            return {"code": 2333, "msg": "连接错误：图书馆系统可能无法正常访问"}
-        except Exception as e:
-            traceback.print_exc()
-            return {"code": 999, "msg": f"获取个人信息时未记录的错误：{str(e)}"}
+            self._conn.commit()
 
-    def get_borrow_list(self):
-        """获取当前借阅列表"""
-        url = urljoin(BASE_URL, "/reader/book_lst.php")
+    def delete(self, user):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE user = ?", (user,))
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class SessionManager:
+    """
+    登录状态管理：保存每个用户的 cookies，尽量避免重复登录
+    validate_interval: cookies 在最近一次确认有效后的这段时间（秒）内直接使用，不再检查；
+    超过后先用 check_session 发一个请求确认，仍有效则继续使用；只有确认过期（1006）才删除 cookies 并重新登录，
+    超时、连接错误、熔断等其它失败原样返回给调用方，保留 cookies 供下次使用
+    reauth: 重新登录的回调 reauth(client) -> 登录结果，需自行处理验证码，
+    成功时返回 {"code": 1000, "data": {"cookies": ...}}；同一用户并发的重新登录只执行一次
+    factory: 由 cookies 创建客户端，默认 Client，多租户时可传 tenant.client
+    """
+
+    def __init__(self, store=None, validate_interval: float = 600, factory=None):
+        self.store = store if store is not None else MemorySessionStore()
+        self.validate_interval = validate_interval
+        self.factory = factory or Client
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def client(self, user, reauth=None):
+        """返回 (持有有效 cookies 的客户端, None)，无法确认或无法登录时返回 (None, 失败的结果)"""
+        return self._client(user, reauth)[:2]
+
+    def _client(self, user, reauth):
+        entry = self.store.get(user)
+        if entry is not None:
+            cookies, validated_at = entry
+            client = self.factory(cookies)
+            if time.time() - validated_at < self.validate_interval:
+                return client, None, False
+            result = client.check_session()
+            if result["code"] == 1000:
+                self.store.set(user, cookies)
+                return client, None, False
+            if result["code"] != 1006:
+                return None, result, False
+            self.store.delete(user)
+        return self._reauth(user, reauth) + (True,)
+
+    def call(self, user, method: str, *args, reauth=None):
+        """
+        以用户的登录状态调用接口，返回接口结果；
+        接口返回 1006 时重新登录一次后重试，无法登录时返回登录结果
+        """
+        client, error, relogged = self._client(user, reauth)
+        if client is None:
+            return error
+        result = getattr(client, method)(*args)
+        if result["code"] == 1006 and not relogged:
+            self.store.delete(user)
+            client, error = self._reauth(user, reauth)
+            if client is None:
+                return error
+            result = getattr(client, method)(*args)
+        if result["code"] == 1000:
+            self.store.set(user, client.cookies)
+        return result
+
+    def invalidate(self, user):
+        self.store.delete(user)
+
+    def _reauth(self, user, reauth):
+        with self._lock:
+            future = self._inflight.get(user)
+            owner = future is None
+            if owner:
+                future = self._inflight[user] = Future()
+        if not owner:
+            return future.result()
         try:
-            req_borrow = self.sess.get(
-                url,
-                headers=self.headers,
-                cookies=self.cookies,
-                timeout=TIMEOUT,
+            outcome = self._login(user, reauth)
+            future.set_result(outcome)
+            return outcome
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(user, None)
+
+    def _login(self, user, reauth):
+        if reauth is None:
+            return None, {"code": 1006, "msg": "登录过期，请重新登录"}
+        result = reauth(self.factory({}))
+        if result.get("code") != 1000:
+            return None, result
+        cookies = result["data"]["cookies"]
+        self.store.set(user, cookies)
+        return self.factory(cookies), None
+
+
+class MemorySnapshotStore:
+    """进程内的借阅快照存储：用户 -> {"loans": {条码号: 应还日期}, "fines": [欠款标识]}"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, user):
+        with self._lock:
+            return copy.deepcopy(self._data.get(user))
+
+    def set(self, user, snapshot):
+        with self._lock:
+            self._data[user] = copy.deepcopy(snapshot)
+
+    def delete(self, user):
+        with self._lock:
+            self._data.pop(user, None)
+
+
+class SqliteSnapshotStore:
+    """基于 SQLite 的借阅快照存储，两次批量刷新之间保存每个用户上次的借阅与欠款"""
+
+    def __init__(self, path: str):
+        import sqlite3
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots "
+            "(user TEXT PRIMARY KEY, snapshot TEXT, updated REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, user):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT snapshot FROM snapshots WHERE user = ?", (user,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, user, snapshot):
+        with self._lock:
+            self._conn.execute(
+                "REPLACE INTO snapshots VALUES (?, ?, ?)",
+                (user, json.dumps(snapshot, ensure_ascii=False), time.time()),
             )
-            doc = pq(req_borrow.text)
-            if doc("h5.box_bgcolor").text() == "登录我的图书馆":
-                return {"code": 1006, "msg": "登录过期，请重新登录"}
-            if str(doc(".iconerr")) != "":
-                return {"code": 1005, "msg": "当前无借阅"}
-
-            trs = list(doc("table:eq(0) tr").items())
-            result = {
-                "now": doc("div#mylib_content p[style='margin:10px auto;'] b:first")
-                .text()
-                .strip(),
-                "max": doc("div#mylib_content p[style='margin:10px auto;'] b:eq(1)")
-                .text()
-                .strip(),
-                "books": [
-                    {
-                        "title": trs[i]("td:eq(1) a.blue").text(),
-                        "author": trs[i]("td:eq(1)").text().split("/")[1].strip(),
-                        "location": trs[i]("td:eq(5)").text(),
-                        "borrow_date": trs[i]("td:eq(2)").text(),
-                        "due_date": trs[i]("td:eq(3)").text().strip(),
-                        "cnum": trs[i]("td:eq(4)").text(),
-                        "bar_code": trs[i]("td:eq(0)").text(),
-                        "marc_no": self.get_marc_no(
-                            trs[i]("td:eq(1) a.blue").attr("href")
-                        ),
-                    }
-                    for i in range(1, len(trs))
-                ],
-            }
-            return {"code": 1000, "msg": "获取借阅列表成功", "data": result}
-        except exceptions.Timeout:
-            return {"code": 1003, "msg": "获取借阅列表超时"}
-        except (
-            exceptions.RequestException,
-            json.decoder.JSONDecodeError,
-            AttributeError,
-        ):
-            traceback.print_exc()
-            return {"code": 2333, "msg": "连接错误：图书馆系统可能无法正常访问"}
-        except Exception as e:
-            traceback.print_exc()
-            return {"code": 999, "msg": "获取借阅列表时未记录的错误：" + str(e)}
+            self._conn.commit()
 
-    def get_borrow_history(self):
-        """获取历史借阅列表"""
-        url = urljoin(BASE_URL, "/reader/book_hist.php")
-        try:
-            req_history = self.sess.post(
-                url,
-                headers=self.headers,
-                cookies=self.cookies,
-                data={"para_string": "all"},
-                timeout=TIMEOUT,
+    def delete(self, user):
+        with self._lock:
+            self._conn.execute("DELETE FROM snapshots WHERE user = ?", (user,))
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class RefreshEngine:
+    """
+    批量刷新多个用户的当前借阅与欠款，只产出与上次快照相比的变化
+    pairs 为 (用户, cookies) 的可迭代对象，可以是生成器；同时最多 max_workers 个用户在刷新，
+    客户端由 factory(cookies) 创建，默认使用共享的 transport 与 scheduler 并走 "bulk" 通道；
+    未传入 scheduler 时创建一个默认限速的 Scheduler，批量任务始终受限速约束
+    run 逐个产出事件：
+        {"type": "delta", "user", "new_loans", "due_date_changed", "new_fines"}  借阅或欠款有变化
+        {"type": "expired", "user"}  登录过期（1006），需要重新登录
+        {"type": "error", "user", "code", "msg"}  其它失败（含图书馆返回的错误页），快照保持不变
+    用户第一次刷新时所有借阅与欠款都视为新增
+    """
+
+    def __init__(
+        self,
+        store=None,
+        factory=None,
+        config: Config = None,
+        transport: Transport = None,
+        scheduler: Scheduler = None,
+        max_workers: int = 16,
+        parser="lxml",
+    ):
+        self.store = store if store is not None else MemorySnapshotStore()
+        self.transport = transport or Transport(pool_size=max_workers)
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        self.max_workers = max_workers
+        self.factory = factory or (
+            lambda cookies: Client(
+                cookies,
+                transport=self.transport,
+                parser=parser,
+                config=config,
+                scheduler=self.scheduler,
+                priority="bulk",
             )
-            doc = pq(req_history.text)
-            if doc("h5.box_bgcolor").text() == "登录我的图书馆":
-                return {"code": 1006, "msg": "登录过期，请重新登录"}
-            if str(doc(".iconerr")) != "":
-                return {"code": 1005, "msg": "无历史借阅"}
-
-            trs = list(doc("table tr").items())
-            result = [
-                {
-                    "index": trs[i]("td:eq(0)").text(),
-                    "title": trs[i]("td:eq(2) a.blue").text(),
-                    "author": trs[i]("td:eq(3)").text(),
-                    "location": trs[i]("td:eq(6)").text(),
-                    "borrow_date": trs[i]("td:eq(4)").text(),
-                    "return_date": trs[i]("td:eq(5)").text(),
-                    "bar_code": trs[i]("td:eq(1)").text(),
-                    "marc_no": self.get_marc_no(trs[i]("td:eq(2) a.blue").attr("href")),
+        )
+        self.stats = collections.Counter()
+
+    @staticmethod
+    def fine_key(fine):
+        return f"{fine['bar_code']}|{fine['borrow_date']}"
+
+    def refresh(self, user, cookies):
+        """刷新单个用户，返回一个事件，借阅与欠款都没有变化时返回 None"""
+        client = self.factory(cookies)
+        loans = client.get_borrow_list()
+        fines = client.get_pay_detail() if loans["code"] in (1000, 1005) else loans
+        for result in (loans, fines):
+            if result["code"] == 1006:
+                return {"type": "expired", "user": user}
+            if result["code"] not in (1000, 1005):
+                return {
+                    "type": "error",
+                    "user": user,
+                    "code": result["code"],
+                    "msg": result["msg"],
                 }
-                for i in range(1, len(trs))
-            ]
-            return {"code": 1000, "msg": "获取历史借阅成功", "data": result}
-        except exceptions.Timeout:
-            return {"code": 1003, "msg": "获取历史借阅超时"}
-        except (
-            exceptions.RequestException,
-            json.decoder.JSONDecodeError,
-            AttributeError,
-        ):
-            traceback.print_exc()
-            return {"code": 2333, "msg": "连接错误：图书馆系统可能无法正常访问"}
-        except Exception as e:
-            traceback.print_exc()
-            return {"code": 999, "msg": f"获取历史借阅时未记录的错误：{str(e)}"}
+        loans = loans["data"]["books"] if loans["code"] == 1000 else []
+        fines = fines["data"] if fines["code"] == 1000 else []
 
-    def get_pay_list(self):
-        """获取账目清单"""
-        url = urljoin(BASE_URL, "/reader/account.php")
+        previous = self.store.get(user) or {"loans": {}, "fines": []}
+        old_loans, old_fines = previous["loans"], set(previous["fines"])
+        delta = {
+            "type": "delta",
+            "user": user,
+            "new_loans": [b for b in loans if b["bar_code"] not in old_loans],
+            "due_date_changed": [
+                {"book": b, "old_due_date": old_loans[b["bar_code"]]}
+                for b in loans
+                if b["bar_code"] in old_loans and old_loans[b["bar_code"]] != b["due_date"]
+            ],
+            "new_fines": [f for f in fines if self.fine_key(f) not in old_fines],
+        }
+        snapshot = {
+            "loans": {b["bar_code"]: b["due_date"] for b in loans},
+            "fines": [self.fine_key(f) for f in fines],
+        }
+        if snapshot != previous:
+            self.store.set(user, snapshot)
+        if delta["new_loans"] or delta["due_date_changed"] or delta["new_fines"]:
+            return delta
+        return None
+
+    def _refresh(self, user, cookies):
         try:
-            req_paylist = self.sess.post(
-                url, headers=self.headers, cookies=self.cookies, timeout=TIMEOUT
-            )
-            doc = pq(req_paylist.text)
-            if doc("h5.box_bgcolor").text() == "登录我的图书馆":
-                return {"code": 1006, "msg": "登录过期，请重新登录"}
-            if str(doc(".iconerr")) != "":
-                return {"code": 1005, "msg": "无账目清单"}
-
-            trs = list(doc("table tr").items())
-            total = "".join(trs[len(trs) - 1]("td:eq(0)").text().strip().split())
-            result = {
-                "description": total[total.find(":") + 1 :][
-                    : total[total.find(":") + 1 :].find("(")
-                ],
-                "items": [
-                    {
-                        "date": trs[i]("td:eq(0)").text().strip(),
-                        "type": trs[i]("td:eq(1)").text().strip(),
-                        "refund": trs[i]("td:eq(2)").text().strip(),
-                        "contribution": trs[i]("td:eq(3)").text().strip(),
-                        "pay_method": trs[i]("td:eq(4)").text().strip(),
-                        "bill_no": trs[i]("td:eq(5)").text().strip(),
-                    }
-                    for i in range(1, len(trs) - 1)
-                ],
-            }
-            return {"code": 1000, "msg": "获取账目清单成功", "data": result}
-        except exceptions.Timeout:
-            return {"code": 1003, "msg": "获取账目清单超时"}
-        except (
-            exceptions.RequestException,
-            json.decoder.JSONDecodeError,
-            AttributeError,
-        ):
-            traceback.print_exc()
-            return {"code": 2333, "msg": "连接错误：图书馆系统可能无法正常访问"}
+            return self.refresh(user, cookies)
         except Exception as e:
-            traceback.print_exc()
-            return {"code": 999, "msg": f"获取账目清单时未记录的错误：{str(e)}"}
+            result = error_result("批量刷新", e)
+            return {"type": "error", "user": user, **result}
 
-    def get_pay_detail(self):
-        """获取欠款记录"""
-        url = urljoin(BASE_URL, "/reader/fine_pec.php")
+    def run(self, pairs):
+        """刷新 pairs 中的所有用户，按完成顺序产出事件；单个用户失败不会中断其余用户"""
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = set()
+        pairs = iter(pairs)
         try:
-            req_paydetail = self.sess.post(
-                url, headers=self.headers, cookies=self.cookies, timeout=TIMEOUT
-            )
-            doc = pq(req_paydetail.text)
-            if doc("h5.box_bgcolor").text() == "登录我的图书馆":
-                return {"code": 1006, "msg": "登录过期，请重新登录"}
-            if str(doc(".iconerr")) != "" and "欠款记录为空" in str(doc(".iconerr")):
-                return {"code": 1005, "msg": "无欠款记录"}
-            table = doc("h2").text("欠款信息").next()
-            trs = list(table("tr").items())
-            result = [
-                {
-                    "title": trs[i]("td:eq(2)").text().strip(),
-                    "author": trs[i]("td:eq(3)").text().strip(),
-                    "location": trs[i]("td:eq(6)").text().strip(),
-                    "borrow_date": trs[i]("td:eq(4)").text().strip(),
-                    "due_date": trs[i]("td:eq(5)").text().strip(),
-                    "marc_no": self.get_marc_no(trs[i]("td:eq(2) a").attr("href")),
-                    "bar_code": trs[i]("td:eq(0)").text().strip(),
-                    "call_no": trs[i]("td:eq(1)").text().strip(),
-                    "payable": trs[i]("td:eq(7)").text().strip(),
-                    "payin": trs[i]("td:eq(8)").text().strip(),
-                    "state": trs[i]("td:eq(9)").text().strip(),
+            while True:
+                # 只从 pairs 中预取有限个用户，不一次性展开整个输入
+                for user, cookies in itertools.islice(
+                    pairs, self.max_workers * 2 - len(pending)
+                ):
+                    pending.add(executor.submit(self._refresh, user, cookies))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    event = future.result()
+                    self.stats["users"] += 1
+                    self.stats[event["type"] if event else "unchanged"] += 1
+                    if event is not None:
+                        yield event
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Watch:
+    __slots__ = ("watchers", "interval", "due")
+
+    def __init__(self, interval, due):
+        self.watchers = 1
+        self.interval = interval
+        self.due = due
+
+
+class HoldingsWatcher:
+    """
+    馆藏可借状态监视：定期获取被关注图书的馆藏，只在某个复本的状态或馆藏地变化时产出事件
+    轮询间隔自适应：每本书从 min_interval 开始，没有变化（或获取失败）时乘以 backoff，最长 max_interval，
+    一旦有变化立即回到 min_interval；关注人数越多的书间隔越短（除以关注人数，不短于 min_interval）
+    每次 poll 最多获取 batch 本已到期的书，客户端默认走共享 scheduler 的 "bulk" 通道，
+    未传入 scheduler 时创建一个默认限速的 Scheduler；传入的 client 不应设置 cache，否则看到的是缓存中的旧馆藏
+    调用方提前结束 poll 时，已取出但还没处理的书立即重新到期，不会从轮询中丢失
+    上次看到的馆藏按书保存为一个字符串（条码号、状态、馆藏地），没有变化时只需一次字符串比较；
+    store 与 RefreshEngine 相同（MemorySnapshotStore / SqliteSnapshotStore），键为 marc_no
+    poll 逐个产出事件：
+        {"type": "change", "marc_no", "bar_code", "old", "new"}  old / new 为 {"status", "location"}，
+            新增的复本 old 为 None，下架的复本 new 为 None
+        {"type": "error", "marc_no", "code", "msg"}  获取失败，上次的馆藏保持不变
+    某本书第一次获取只记录基线，不产出事件；上次有复本而这次一个都没有时视为获取失败（1005），
+    不覆盖上次的馆藏，避免一次异常页面产出整批下架、上架事件
+    """
+
+    def __init__(
+        self,
+        store=None,
+        client=None,
+        config: Config = None,
+        transport: Transport = None,
+        scheduler: Scheduler = None,
+        concurrency: int = 8,
+        batch: int = 500,
+        min_interval: float = 300,
+        max_interval: float = 86400,
+        backoff: float = 2.0,
+        parser="lxml",
+    ):
+        self.store = store if store is not None else MemorySnapshotStore()
+        self.client = client or Client(
+            transport=transport or Transport(pool_size=concurrency),
+            parser=parser,
+            config=config,
+            scheduler=scheduler if scheduler is not None else Scheduler(),
+            priority="bulk",
+        )
+        self.concurrency = concurrency
+        self.batch = batch
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.stats = collections.Counter()
+        self._watches = {}
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._watches)
+
+    def watch(self, marc_no, now: float = None):
+        """关注一本书，多次关注同一本书累加关注人数；新关注的书立即到期"""
+        now = time.time() if now is None else now
+        with self._lock:
+            watch = self._watches.get(marc_no)
+            if watch is not None:
+                watch.watchers += 1
+                return
+            self._watches[marc_no] = _Watch(self.min_interval, now)
+            heapq.heappush(self._heap, (now, marc_no))
+
+    def unwatch(self, marc_no):
+        """取消一次关注，关注人数归零时不再轮询并删除保存的馆藏"""
+        with self._lock:
+            watch = self._watches.get(marc_no)
+            if watch is None:
+                return
+            watch.watchers -= 1
+            if watch.watchers > 0:
+                return
+            del self._watches[marc_no]
+        self.store.delete(marc_no)
+
+    def due(self, now: float = None, limit: int = None):
+        """取出已到期的书（最多 limit 本），取出的书在 poll 处理完后重新排期"""
+        now = time.time() if now is None else now
+        limit = self.batch if limit is None else limit
+        marc_nos = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(marc_nos) < limit:
+                due, marc_no = heapq.heappop(self._heap)
+                watch = self._watches.get(marc_no)
+                # 堆中过期的条目（已取消关注或已重新排期）直接丢弃
+                if watch is not None and watch.due == due:
+                    marc_nos.append(marc_no)
+        return marc_nos
+
+    def next_due(self):
+        """最近一本书的到期时间，没有关注任何书时返回 None"""
+        with self._lock:
+            while self._heap:
+                due, marc_no = self._heap[0]
+                watch = self._watches.get(marc_no)
+                if watch is not None and watch.due == due:
+                    return due
+                heapq.heappop(self._heap)
+        return None
+
+    def _reschedule(self, marc_no, changed, now):
+        with self._lock:
+            watch = self._watches.get(marc_no)
+            if watch is None:
+                return
+            if changed:
+                watch.interval = self.min_interval
+            else:
+                watch.interval = min(watch.interval * self.backoff, self.max_interval)
+            watch.due = now + max(self.min_interval, watch.interval / watch.watchers)
+            heapq.heappush(self._heap, (watch.due, marc_no))
+
+    def _requeue(self, marc_nos, now):
+        """已取出但没有处理的书立即重新到期，轮询间隔不变"""
+        with self._lock:
+            for marc_no in marc_nos:
+                watch = self._watches.get(marc_no)
+                if watch is not None:
+                    watch.due = now
+                    heapq.heappush(self._heap, (now, marc_no))
+
+    @staticmethod
+    def snapshot(books):
+        return "\x1e".join(
+            f"{b['bar_code']}\x1f{b['status']}\x1f{b['location']}" for b in books
+        )
+
+    @staticmethod
+    def copies(snapshot):
+        """snapshot 还原为 条码号 -> (状态, 馆藏地)"""
+        rows = (row.split("\x1f") for row in snapshot.split("\x1e") if row)
+        return {bar_code: (status, location) for bar_code, status, location in rows}
+
+    def changes(self, marc_no, old, new):
+        """两次快照之间状态或馆藏地有变化的复本，产出 change 事件"""
+        old, new = self.copies(old), self.copies(new)
+        for bar_code in dict.fromkeys([*old, *new]):
+            before, after = old.get(bar_code), new.get(bar_code)
+            if before != after:
+                yield {
+                    "type": "change",
+                    "marc_no": marc_no,
+                    "bar_code": bar_code,
+                    "old": before and {"status": before[0], "location": before[1]},
+                    "new": after and {"status": after[0], "location": after[1]},
                 }
-                for i in range(1, len(trs))
-            ]
-            return {"code": 1000, "msg": "获取欠款信息成功", "data": result}
-        except exceptions.Timeout:
-            return {"code": 1003, "msg": "获取欠款信息超时"}
-        except (
-            exceptions.RequestException,
-            json.decoder.JSONDecodeError,
-            AttributeError,
-        ):
-            traceback.print_exc()
-            return {"code": 2333, "msg": "连接错误：图书馆系统可能无法正常访问"}
-        except Exception as e:
-            traceback.print_exc()
-            return {"code": 999, "msg": f"获取欠款信息时未记录的错误：{str(e)}"}
 
-    def get_recommendation_books(self):
-        url = urljoin(BASE_URL, "/top/top_lend.php?cls_no=ALL")
+    def poll(self, now: float = None):
+        """获取一批已到期的书，按完成顺序产出事件"""
+        marc_nos = self.due(now)
+        pending = set(marc_nos)
         try:
-            req_popular = self.sess.get(url, headers=self.headers, timeout=TIMEOUT)
-            doc = pq(req_popular.text)
-            trs = list(doc("table.table_line tr").items())
-            return {
-                "code": 1000,
-                "msg": "获取热门借阅成功",
-                "data": {
-                    "updated": int(time.time()),
-                    "books": [
-                        {
-                            "index": trs[i]("td:eq(0)").text(),
-                            "title": trs[i]("td:eq(1) a").text(),
-                            "author": trs[i]("td:eq(2)").text(),
-                            "publisher": trs[i]("td:eq(3)").text(),
-                            "total_num": trs[i]("td:eq(5)").text(),
-                            "borrowed_times": trs[i]("td:eq(6)").text(),
-                            "borrowed_ratio": trs[i]("td:eq(7)").text(),
-                            "marc_no": self.get_marc_no(
-                                trs[i]("td:eq(1) a").attr("href")
-                            ),
-                            "call_no": trs[i]("td:eq(4)").text(),
-                        }
-                        for i in range(1, len(trs))
-                    ],
-                },
-            }
-        except exceptions.Timeout:
-            return {"code": 1003, "msg": "获取热门借阅超时"}
-        except (
-            exceptions.RequestException,
-            json.decoder.JSONDecodeError,
-            AttributeError,
-        ):
-            traceback.print_exc()
-            return {"code": 2333, "msg": "连接错误：图书馆系统可能无法正常访问"}
-        except Exception as e:
-            traceback.print_exc()
-            return {"code": 999, "msg": f"获取热门借阅时未记录的错误：{str(e)}"}
+            for marc_no, result in self.client.iter_book_details(marc_nos, self.concurrency):
+                pending.discard(marc_no)
+                if marc_no not in self._watches:
+                    continue  # 获取期间已取消关注
+                self.stats["polls"] += 1
+                previous = self.store.get(marc_no)
+                if result["code"] == 1000 and not result["data"]["books"] and previous:
+                    result = {"code": 1005, "msg": "馆藏为空，保留上次的馆藏"}
+                if result["code"] != 1000:
+                    self.stats["errors"] += 1
+                    self._reschedule(marc_no, False, time.time() if now is None else now)
+                    yield {
+                        "type": "error",
+                        "marc_no": marc_no,
+                        "code": result["code"],
+                        "msg": result["msg"],
+                    }
+                    continue
+                current = self.snapshot(result["data"]["books"])
+                changed = previous is not None and previous != current
+                if previous != current:
+                    self.store.set(marc_no, current)
+                self._reschedule(marc_no, changed, time.time() if now is None else now)
+                if changed:
+                    self.stats["changed"] += 1
+                    for event in self.changes(marc_no, previous, current):
+                        self.stats["events"] += 1
+                        yield event
+                else:
+                    self.stats["baseline" if previous is None else "unchanged"] += 1
+        finally:
+            if pending:
+                self._requeue(pending, time.time() if now is None else now)
 
-    def search_book(self, type, content: str, page: int):
-        """
-        搜索图书
-        type: 书名-title 作者-author 主题词-keyword ISBN/ISSN-isbn 订购号-asordno 分类号-coden 索书号-callno 出版社-publisher 丛书名-series
-        """
-        url = urljoin(BASE_URL, "/opac/openlink.php")
+    def run(self, stop: threading.Event = None, idle: float = 60):
+        """持续轮询，逐个产出事件；没有到期的书时最多等待 idle 秒，stop 被设置后返回"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            yield from self.poll()
+            due = self.next_due()
+            wait_for = idle if due is None else min(max(due - time.time(), 0.0), idle)
+            if wait_for:
+                stop.wait(wait_for)
+
+
+class SingleFlight:
+    """
+    合并相同键的并发调用：某个键正在执行时，后到的调用等待并共享第一次调用的结果（同一个对象，调用方不应修改）
+    键的第一个元素为接口名，按接口统计调用次数与实际执行次数，二者之比即扇入比
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.calls = collections.Counter()
+        self.executions = collections.Counter()
+
+    def do(self, key: tuple, func, *args):
+        with self._lock:
+            self.calls[key[0]] += 1
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.executions[key[0]] += 1
+        if not owner:
+            return future.result()
         try:
-            data = {
-                "onlylendable": "yes",
-                type: content,
-                "page": page,
-            }
-            req_search = self.sess.get(
-                url, headers=self.headers, params=data, timeout=TIMEOUT
-            )
-            doc = pq(req_search.text)
-            container = doc("div#container")
-            count = container("strong.red").text()
-            search_list = container("ol#search_book_list").items("li")
-            total_page = container("span.num_prev b font[color='black']").text()
-            pages = int(total_page) if total_page != "" else 1
-            if page > pages:
-                return {"code": 999, "msg": "已超过最多页数"}
+            result = func(*args)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
 
-            result = {
-                "type": type,
-                "content": content,
-                "count": count,
-                "page": page,
-                "pages": pages,
-                "books": [
-                    {
-                        "type": i("h3 span").text(),
-                        "title": i("h3 a").text()[i("h3 a").text().find(".") + 1 :],
-                        "author": re.findall(r"span>(.*)<", str(i("p")))[1].strip(),
-                        "publisher": "".join(
-                            re.findall(r"(.*) <br/>&#13", str(i("p")))[2]
-                            .strip()
-                            .split()
-                        ),
-                        "total_num": re.findall(r"馆藏复本：(\d+)", str(i("p")))[0],
-                        "loanable_num": re.findall(r"可借复本：(\d+)", str(i("p")))[0],
-                        "marc_no": self.get_marc_no(i("p a").attr("href")),
-                        "call_no": re.findall(r"</a>(.*)</h3>", str(i("h3")))[
-                            0
-                        ].strip(),
-                    }
-                    for i in search_list
-                ],
+    def stats(self):
+        with self._lock:
+            calls, executions = dict(self.calls), dict(self.executions)
+        endpoints = {
+            name: {
+                "calls": n,
+                "upstream": executions[name],
+                "fan_in": round(n / executions[name], 2),
             }
-            return {"code": 1000, "msg": "搜索图书成功", "data": result}
-        except exceptions.Timeout:
-            return {"code": 1003, "msg": "搜索图书超时"}
-        except (
-            exceptions.RequestException,
-            json.decoder.JSONDecodeError,
-            AttributeError,
-        ):
-            traceback.print_exc()
-            return {"code": 2333, "msg": "连接错误：图书馆系统可能无法正常访问"}
-        except Exception as e:
-            traceback.print_exc()
-            return {"code": 999, "msg": f"搜索图书时未记录的错误：{str(e)}"}
+            for name, n in calls.items()
+        }
+        total, upstream = sum(calls.values()), sum(executions.values())
+        return {
+            "calls": total,
+            "upstream": upstream,
+            "fan_in": round(total / upstream, 2) if upstream else None,
+            "endpoints": endpoints,
+        }
 
-    def get_book_detail(self, marc_no: str):
-        """获取图书详情"""
-        url = urljoin(BASE_URL, "/opac/item.php")
-        data = {"marc_no": marc_no}
-        try:
-            req_detail = self.sess.get(
-                url, headers=self.headers, params=data, timeout=TIMEOUT
+
+class Gateway:
+    """
+    面向应用的 HTTP 网关：公共接口参数相同的并发请求合并为一次上游请求；
+    个人接口按 Authorization: Bearer <令牌> 取 SessionManager 中该会话的登录状态，所有用户共用一个连接池，
+    同一会话相同的并发请求同样合并
+        GET /recommendation                          热门借阅
+        GET /search?type=title&content=Python&page=1 搜索
+        GET /book/<marc_no>                          图书详情
+        GET /me/<info|borrow_list|borrow_history|pay_list|pay_detail>  个人接口，需携带令牌
+        PUT /session  {"cookies": {...}}             保存登录后的 cookies，返回 {"data": {"token": ...}}；
+                                                     携带令牌时更新该会话的 cookies
+        GET /stats                                   各接口的请求数、上游请求数与扇入比
+    令牌由网关随机生成，不信任客户端给出的用户名：只有持有令牌的一方能使用或覆盖该会话的 cookies；
+    SessionManager 中以令牌的 SHA-256 为键，存储泄露时也拿不到可用的令牌
+    响应体为接口结果的 JSON，HTTP 状态码只表示网关层面的错误（参数缺失、令牌无效、未知路径）
+    """
+
+    private = {
+        "info": "get_info",
+        "borrow_list": "get_borrow_list",
+        "borrow_history": "get_borrow_history",
+        "pay_list": "get_pay_list",
+        "pay_detail": "get_pay_detail",
+    }
+
+    def __init__(
+        self,
+        config: Config = None,
+        transport: Transport = None,
+        sessions: SessionManager = None,
+        cache: CatalogCache = None,
+        parser="lxml",
+    ):
+        self.config = config if config is not None else default_config()
+        self.transport = transport or Transport(pool_size=self.config.pool_size)
+        self.client = Client(
+            transport=self.transport, parser=parser, cache=cache, config=self.config
+        )
+        self.sessions = sessions or SessionManager(
+            factory=lambda cookies: Client(
+                cookies, transport=self.transport, parser=parser, config=self.config
             )
-            doc = pq(req_detail.text)
-            details = doc("#item_detail dl").items()
-            trs = list(doc("table#item tr").items())
-            dictionary = {
-                "其它题名": "oth_title",
-                "个人责任者": "author",
-                "个人次要责任者": "oth_author",
-                "学科主题": "category",
-                "出版发行项": "publisher",
-                "ISBN及定价": "isbn",
-                "载体形态项": "physical",
-                "一般附注": "notes",
-                "责任者附注": "author_notes",
-                "提要文摘附注": "abstract",
-                "中图法分类号": "call_no",
-            }
-            result = {}
-            for i in details:
-                if "题名/责任者" in i("dt").text():
-                    result["title"] = i("dd a").text()
-                    result["full_title"] = i("dd").text()
-                for key in dictionary.keys():
-                    if key in i("dt").text():
-                        result[dictionary[key]] = i("dd").text()
-            result["books"] = [
-                {
-                    "annual_roll": "".join(trs[n]("td:eq(2)").text().split()),
-                    "location": trs[n]("td:eq(3)").text().strip(),
-                    "return_location": trs[n]("td:eq(3)").attr("title"),
-                    "status": trs[n]("td:eq(4)").text(),
-                    "bar_code": trs[n]("td:eq(1)").text(),
-                    "call_no": trs[n]("td:eq(0)").text(),
-                }
-                for n in range(1, len(trs))
-            ]
-            return {"code": 1000, "msg": "获取图书详情成功", "data": result}
-        except exceptions.Timeout:
-            return {"code": 1003, "msg": "获取图书详情超时"}
-        except (
-            exceptions.RequestException,
-            json.decoder.JSONDecodeError,
-            AttributeError,
-        ):
-            traceback.print_exc()
-            return {"code": 2333, "msg": "连接错误：图书馆系统可能无法正常访问"}
-        except Exception as e:
-            traceback.print_exc()
-            return {"code": 999, "msg": "获取图书详情时未记录的错误：" + str(e)}
+        )
+        self.flight = SingleFlight()
 
-    @classmethod
-    def encode_password(cls, sca, password):
-        encode_password = ""
-        for i in range(len(password)):
+    @staticmethod
+    def session_key(token: str):
+        return "gateway:" + hashlib.sha256(token.encode()).hexdigest()
+
+    def dispatch(self, method: str, path: str, query: dict, token=None, body=b""):
+        """返回 (HTTP 状态码, 结果)，与 HTTP 服务器无关，可直接调用；token 为请求携带的会话令牌"""
+        if path == "/stats":
+            return 200, self.flight.stats()
+        if path == "/session" and method in ("PUT", "POST"):
             try:
-                num0 = sca.index(password[i])
-            except:
-                num0 = -1
-            if num0 == -1:
-                code = ord(password[i])
-                code = hex(code)[2:]
-            else:
-                code = sca[(num0 + 3) % 62]
-                code = hex(ord(code))[2:]
-            num1 = int(random.random() * 62)
-            num2 = int(random.random() * 62)
-            encode_password += str(sca[num1]) + str(code) + str(sca[num2])
-        return encode_password
+                cookies = dict(json.loads(body or b"{}")["cookies"])
+            except (ValueError, KeyError, TypeError):
+                return 400, {"code": 999, "msg": "需要 cookies"}
+            if token is None:
+                import secrets
 
-    @classmethod
-    def check_password(cls, password):
-        if len(password) < 8 and len(password) >= 12:
-            return False
-        if bool(re.search(r"\d", password)) == False:
-            return False
-        if any(x.isupper() for x in password) == False:
-            return False
-        if any(x.islower() for x in password) == False:
-            return False
-        return True
+                token = secrets.token_urlsafe(32)
+            elif self.sessions.store.get(self.session_key(token)) is None:
+                return 401, {"code": 1006, "msg": "令牌无效或会话已过期"}
+            self.sessions.store.set(self.session_key(token), cookies)
+            return 200, {"code": 1000, "msg": "已保存登录状态", "data": {"token": token}}
+        if method != "GET":
+            return 405, {"code": 999, "msg": "不支持的请求方法"}
+        if path == "/recommendation":
+            key = ("get_recommendation_books",)
+            return 200, self.flight.do(key, self.client.get_recommendation_books)
+        if path == "/search":
+            try:
+                args = (query["type"], query["content"], int(query.get("page", 1)))
+            except (KeyError, ValueError):
+                return 400, {"code": 999, "msg": "需要 type、content 与整数 page"}
+            return 200, self.flight.do(("search_book", *args), self.client.search_book, *args)
+        if path.startswith("/book/") and len(path) > len("/book/"):
+            marc_no = path[len("/book/") :]
+            key = ("get_book_detail", marc_no)
+            return 200, self.flight.do(key, self.client.get_book_detail, marc_no)
+        if path.startswith("/me/") and path[len("/me/") :] in self.private:
+            if not token:
+                return 401, {"code": 1006, "msg": "缺少 Authorization: Bearer 令牌"}
+            user = self.session_key(token)
+            if self.sessions.store.get(user) is None:
+                return 401, {"code": 1006, "msg": "令牌无效或会话已过期"}
+            endpoint = self.private[path[len("/me/") :]]
+            return 200, self.flight.do((endpoint, user), self.sessions.call, user, endpoint)
+        return 404, {"code": 999, "msg": "未知的接口"}
 
-    @classmethod
-    def get_marc_no(cls, content):
-        marc_no = re.findall(r"marc_no=(.*)", content)
-        if not marc_no:
-            return None
-        return marc_no[0]
+    def handler(self):
+        """绑定到本网关的 BaseHTTPRequestHandler 子类"""
+        from http.server import BaseHTTPRequestHandler
+
+        gateway = self
+
+        class GatewayHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle_any(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                parts = urlsplit(self.path)
+                scheme, _, token = (self.headers.get("Authorization") or "").partition(" ")
+                status, result = gateway.dispatch(
+                    self.command,
+                    parts.path,
+                    dict(parse_qsl(parts.query)),
+                    token.strip() if scheme.lower() == "bearer" and token.strip() else None,
+                    body,
+                )
+                payload = dumps(result)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = handle_any
+            do_POST = handle_any
+            do_PUT = handle_any
+
+        return GatewayHandler
+
+    def serve(self, host="127.0.0.1", port=0):
+        """在后台线程启动网关，返回 (server, base_url)；server.shutdown() 停止"""
+        from http.server import ThreadingHTTPServer
+
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, "http://%s:%d" % server.server_address